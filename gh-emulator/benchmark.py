@@ -0,0 +1,237 @@
+"""End to end crawl benchmark against the local GitHub emulator.
+
+Starts ``main.py`` on a free local port, then crawls the same synthetic users once
+per queue concurrency, each run in a fresh process with a fresh database, e.g.::
+
+    python gh-emulator/benchmark.py --users 200 --concurrency 8,32,128
+"""
+import asyncio
+import json
+import os
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+import click
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT.parent / 'src'))
+
+from codehub_crawler.config import Config, CrawlMode  # noqa: E402
+from codehub_crawler.entities import Task, TaskStatus, User  # noqa: E402
+from codehub_crawler.pipeline import CrawlPipeline  # noqa: E402
+from codehub_crawler.storages.codehub_storage import GithubStorage  # noqa: E402
+from codehub_crawler.storages.crawler_storage import CrawlerSQLiteStorage  # noqa: E402
+from codehub_crawler.storages.http_cache import SQLiteHTTPCache  # noqa: E402
+from codehub_crawler.storages.sqlite_engine import SQLiteWriter, create_sqlite_engine  # noqa: E402
+from codehub_crawler.use_cases import UserRepositoriesUseCase  # noqa: E402
+from common.worker_pool_queue import WorkerPoolQueue  # noqa: E402
+
+
+class TimedSQLiteWriter(SQLiteWriter):
+    """Records how long write transactions wait for the single writer connection."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.waits: list[float] = []
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator:
+        started = time.perf_counter()
+        async with self._lock:
+            self.waits.append(time.perf_counter() - started)
+            async with self.session() as session, session.begin():
+                yield session
+                await self.flush_buffers(session)
+
+
+class TimedUseCase(UserRepositoriesUseCase):
+    """Records when every task leaves PENDING."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.finished: dict[int, float] = {}
+        self.all_finished = asyncio.Event()
+        self.expected_tasks = 0
+
+    async def _set_task_status(self, task: Task, status: TaskStatus):
+        await super()._set_task_status(task, status)
+        if status != TaskStatus.PENDING:
+            self._finished(task)
+
+    async def _complete_crawl(self, task: Task, pipeline: CrawlPipeline):
+        await super()._complete_crawl(task, pipeline)
+        self._finished(task)
+
+    def _finished(self, task: Task) -> None:
+        self.finished[task.id] = time.perf_counter()
+        if len(self.finished) >= self.expected_tasks:
+            self.all_finished.set()
+
+
+def open_sockets() -> Optional[int]:
+    fd_dir = Path('/proc/self/fd')
+    if not fd_dir.exists():
+        return None
+    count = 0
+    for fd in fd_dir.iterdir():
+        try:
+            count += os.readlink(fd).startswith('socket:')
+        except OSError:
+            pass
+    return count
+
+
+def percentile(values: list[float], q: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method='inclusive')[q - 1]
+
+
+async def run_once(options: dict) -> dict:
+    config = Config()
+    config.GH_BASE_URL = options['base_url']
+    config.GH_API_TOKENS = [f'bench-{i}' for i in range(options['tokens'])]
+    config.GH_REQUESTS_PER_SECOND = options['rps']
+    config.GH_REQUESTS_BURST = max(int(options['rps']), 1)
+    config.CRAWL_MODE = CrawlMode(options['mode'])
+    config.QUEUE_CONCURRENCY = options['concurrency']
+    config.SQLITE_DB_FILE = options['db_file']
+
+    writer = TimedSQLiteWriter(create_sqlite_engine(config, pool_size=1))
+    engine = create_sqlite_engine(config, config.SQLITE_READ_POOL_SIZE)
+    storage = CrawlerSQLiteStorage(engine, writer)
+    await storage._create_all()
+    # built like the app's context, so the default configuration is measured
+    cache = (
+        SQLiteHTTPCache(engine, writer, config.GH_HTTP_CACHE_BUFFER_SIZE)
+        if config.GH_HTTP_CACHE_ENABLED
+        else None
+    )
+    remote = GithubStorage(config, cache=cache)
+    queue = WorkerPoolQueue(config.QUEUE_CONCURRENCY, config.QUEUE_MAX_DEPTH)
+    usecase = TimedUseCase(storage, remote, queue, config)
+    await remote.open()
+    await queue.start()
+
+    users = [User(name=f'user-{i}') for i in range(options['users'])]
+    usecase.expected_tasks = len(users)
+    peak_sockets = 0
+
+    async def sample_sockets() -> None:
+        nonlocal peak_sockets
+        while True:
+            peak_sockets = max(peak_sockets, open_sockets() or 0)
+            await asyncio.sleep(0.05)
+
+    sampler = asyncio.create_task(sample_sockets())
+    started = time.perf_counter()
+    created = {}
+    for user in users:
+        task_id = await usecase.create_task(user)
+        created[task_id] = time.perf_counter()
+    await usecase.all_finished.wait()
+    elapsed = time.perf_counter() - started
+    sampler.cancel()
+
+    latencies = [usecase.finished[task_id] - created[task_id] for task_id in created]
+    repos = 0
+    statuses: dict[str, int] = {}
+    for task_id in created:
+        task = await storage.get_task(task_id)
+        repos += task.progress.done
+        statuses[task.status.value] = statuses.get(task.status.value, 0) + 1
+
+    await queue.stop()
+    await remote.close()
+    await writer.engine.dispose()
+    await storage.engine.dispose()
+    return {
+        'concurrency': options['concurrency'],
+        'tasks': statuses,
+        'repos': repos,
+        'seconds': round(elapsed, 3),
+        'repos_per_sec': round(repos / elapsed, 1),
+        'task_p50': round(percentile(latencies, 50), 3),
+        'task_p99': round(percentile(latencies, 99), 3),
+        # ru_maxrss is in KiB on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'lock_wait_total': round(sum(writer.waits), 3),
+        'lock_wait_max': round(max(writer.waits, default=0.0), 4),
+        'transactions': len(writer.waits),
+        'peak_sockets': peak_sockets,
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_emulator(port: int, emulator_args: list[str]) -> subprocess.Popen:
+    emulator = subprocess.Popen(
+        [sys.executable, str(ROOT / 'main.py'), '--host', '127.0.0.1', '--port', str(port)]
+        + emulator_args
+    )
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/docs', timeout=1)
+            return emulator
+        except OSError:
+            time.sleep(0.1)
+    emulator.kill()
+    raise click.ClickException('Emulator did not start')
+
+
+@click.command(context_settings={'ignore_unknown_options': True})
+@click.option('--users', default=100, show_default=True)
+@click.option('--concurrency', default='8,32,128', show_default=True, help='Comma separated.')
+@click.option('--mode', type=click.Choice([mode.value for mode in CrawlMode]), default='list')
+@click.option('--rps', default=1000.0, show_default=True, help='Client side request rate.')
+@click.option('--tokens', default=1, show_default=True)
+@click.option('--run-once', 'run_once_json', hidden=True)
+@click.argument('emulator_args', nargs=-1, type=click.UNPROCESSED)
+def main(users, concurrency, mode, rps, tokens, run_once_json, emulator_args):
+    """Benchmark crawls; extra arguments (e.g. --error-rate 0.01) go to the emulator."""
+    if run_once_json:
+        print(json.dumps(asyncio.run(run_once(json.loads(run_once_json)))))
+        return
+
+    port = free_port()
+    emulator = start_emulator(port, list(emulator_args))
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for level in [int(value) for value in concurrency.split(',')]:
+                options = {
+                    'base_url': f'http://127.0.0.1:{port}',
+                    'users': users,
+                    'concurrency': level,
+                    'mode': mode,
+                    'rps': rps,
+                    'tokens': tokens,
+                    'db_file': os.path.join(tmp, f'bench-{level}.sqlite'),
+                }
+                # a process per run keeps peak RSS and sockets separate
+                result = subprocess.run(
+                    [sys.executable, __file__, '--run-once', json.dumps(options)],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                )
+                print(result.stdout.strip().splitlines()[-1], flush=True)
+    finally:
+        emulator.terminate()
+        emulator.wait()
+
+
+if __name__ == '__main__':
+    main()
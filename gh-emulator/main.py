@@ -1,33 +1,179 @@
 import asyncio
+import hashlib
+import json
+import math
+import random
 import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
 
+import click
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 
-app = FastAPI()
 
+@dataclass
+class EmulatorConfig:
+    # every user owns a number of repositories in [repos_min, repos_max], stable per username
+    repos_min: int = 3
+    repos_max: int = 50
+    # response latency is log-normal around the median; sigma 0 makes it fixed
+    list_latency_ms: float = 100.0
+    detail_latency_ms: float = 20.0
+    latency_sigma: float = 0.5
+    # share of requests answered with 502
+    error_rate: float = 0.0
+    default_per_page: int = 30
+    max_per_page: int = 100
+    # requests allowed per token and window, 0 disables rate limiting
+    rate_limit: int = 0
+    rate_limit_window: float = 3600.0
+    # every repo is updated once per period at its own phase, 0 keeps repos unchanged
+    update_period: float = 0.0
+    seed: int = 0
 
-REPOS = {
-    'linux': {'name': 'linux', 'forks': 100, 'stars': 100},
-    'windows': {'name': 'windows', 'forks': 100, 'stars': 100},
-    'python': {'name': 'python', 'forks': 100, 'stars': 100},
-    # 'failure': {'name': 'failure', 'forks': 100, 'stars': 100},
-}
 
+class RateLimitWindow:
+    __slots__ = ('used', 'reset_at')
 
-@app.get("/users/{username}/repos")
-async def repo_list(username):
-    await asyncio.sleep(10)
-    return REPOS
+    def __init__(self, reset_at: float) -> None:
+        self.used = 0
+        self.reset_at = reset_at
 
 
-@app.get('/repos/{username}/{repo}')
-async def repo_detail(username, repo):
-    if repo == 'failure':
-        raise Exception('failure')
-    await asyncio.sleep(1)
-    return REPOS[repo]
+def create_app(config: EmulatorConfig) -> FastAPI:
+    """Creates a GitHub REST API lookalike serving synthetic users and repositories."""
+    app = FastAPI()
+    rng = random.Random(config.seed)
+    windows: dict[str, RateLimitWindow] = {}
+    epoch = datetime(2020, 1, 1, tzinfo=timezone.utc).timestamp()
+
+    def updated_at(user_rng: random.Random) -> str:
+        updated = epoch + user_rng.uniform(0, 365 * 24 * 3600)
+        if config.update_period > 0:
+            phase = user_rng.uniform(0, config.update_period)
+            now = time.time()
+            updated = max(updated, now - (now - phase) % config.update_period)
+        return datetime.fromtimestamp(int(updated), timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    def user_repos(username: str) -> list[dict]:
+        user_rng = random.Random(f'{config.seed}:{username}')
+        count = user_rng.randint(config.repos_min, config.repos_max)
+        return [
+            {
+                'name': f'repo-{i}',
+                'full_name': f'{username}/repo-{i}',
+                'stargazers_count': user_rng.randint(0, 5000),
+                'forks_count': user_rng.randint(0, 500),
+                'updated_at': updated_at(user_rng),
+            }
+            for i in range(count)
+        ]
+
+    async def delay(median_ms: float) -> None:
+        if median_ms <= 0:
+            return
+        latency = median_ms * rng.lognormvariate(0, config.latency_sigma)
+        await asyncio.sleep(latency / 1000)
+
+    def rate_limit_headers(request: Request) -> tuple[dict[str, str], bool]:
+        if not config.rate_limit:
+            return {}, False
+        token = request.headers.get('Authorization', '')
+        now = time.time()
+        window = windows.get(token)
+        if window is None or window.reset_at <= now:
+            window = windows[token] = RateLimitWindow(now + config.rate_limit_window)
+        exceeded = window.used >= config.rate_limit
+        if not exceeded:
+            window.used += 1
+        headers = {
+            'X-RateLimit-Limit': str(config.rate_limit),
+            'X-RateLimit-Remaining': str(config.rate_limit - window.used),
+            'X-RateLimit-Used': str(window.used),
+            # rounded up, an earlier reset than the enforced one sends clients back too soon
+            'X-RateLimit-Reset': str(math.ceil(window.reset_at)),
+        }
+        return headers, exceeded
+
+    def respond(request: Request, payload, headers: dict[str, str]) -> Response:
+        body = json.dumps(payload).encode()
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        headers['ETag'] = etag
+        if request.headers.get('If-None-Match') == etag:
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type='application/json', headers=headers)
+
+    async def answer(request: Request, latency_ms: float, payload) -> Response:
+        await delay(latency_ms)
+        headers, exceeded = rate_limit_headers(request)
+        if exceeded:
+            return Response(status_code=403, headers=headers)
+        if config.error_rate and rng.random() < config.error_rate:
+            return Response(status_code=502, headers=headers)
+        return respond(request, payload, headers)
+
+    @app.get('/users/{username}/repos')
+    async def repo_list(
+        request: Request,
+        username: str,
+        page: int = 1,
+        per_page: Optional[int] = None,
+        sort: Optional[str] = None,
+        direction: Optional[str] = None,
+    ) -> Response:
+        per_page = min(per_page or config.default_per_page, config.max_per_page)
+        repos = user_repos(username)
+        if sort == 'updated':
+            # like GitHub, time sorts default to newest first
+            repos.sort(key=lambda repo: repo['updated_at'], reverse=direction != 'asc')
+        last = max((len(repos) + per_page - 1) // per_page, 1)
+        response = await answer(
+            request,
+            config.list_latency_ms,
+            repos[(page - 1) * per_page : page * per_page],
+        )
+        rels = {'first': 1, 'prev': page - 1} if page > 1 else {}
+        if page < last:
+            rels.update(next=page + 1, last=last)
+        if rels:
+            response.headers['Link'] = ', '.join(
+                f'<{request.url.include_query_params(per_page=per_page, page=n)}>; rel="{rel}"'
+                for rel, n in rels.items()
+            )
+        return response
+
+    @app.get('/repos/{username}/{repo}')
+    async def repo_detail(request: Request, username: str, repo: str) -> Response:
+        repos = {data['name']: data for data in user_repos(username)}
+        if repo not in repos:
+            await delay(config.detail_latency_ms)
+            return Response(status_code=404)
+        return await answer(request, config.detail_latency_ms, repos[repo])
+
+    return app
+
+
+@click.command()
+@click.option('--host', default='0.0.0.0')
+@click.option('--port', default=8000)
+@click.option('--repos-min', default=EmulatorConfig.repos_min, show_default=True)
+@click.option('--repos-max', default=EmulatorConfig.repos_max, show_default=True)
+@click.option('--list-latency-ms', default=EmulatorConfig.list_latency_ms, show_default=True)
+@click.option('--detail-latency-ms', default=EmulatorConfig.detail_latency_ms, show_default=True)
+@click.option('--latency-sigma', default=EmulatorConfig.latency_sigma, show_default=True)
+@click.option('--error-rate', default=EmulatorConfig.error_rate, show_default=True)
+@click.option('--default-per-page', default=EmulatorConfig.default_per_page, show_default=True)
+@click.option('--max-per-page', default=EmulatorConfig.max_per_page, show_default=True)
+@click.option('--rate-limit', default=EmulatorConfig.rate_limit, show_default=True)
+@click.option('--rate-limit-window', default=EmulatorConfig.rate_limit_window, show_default=True)
+@click.option('--update-period', default=EmulatorConfig.update_period, show_default=True)
+@click.option('--seed', default=EmulatorConfig.seed, show_default=True)
+def main(host: str, port: int, **options):
+    """Run a GitHub API emulator with synthetic users."""
+    uvicorn.run(create_app(EmulatorConfig(**options)), host=host, port=port, log_level='warning')
 
 
 if __name__ == '__main__':
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    main()
@@ -1,7 +1,7 @@
 import click
 import uvicorn
 
-from codehub_crawler.cli import crawler_cli
+from codehub_crawler.cli import crawler_cli, worker_cli
 from config import settings
 
 
@@ -26,4 +26,5 @@ def run(host: str, port: int, reload: bool):
 
 if __name__ == '__main__':
     cli.add_command(crawler_cli, 'crawler')
+    cli.add_command(worker_cli, 'worker')
     cli()
@@ -2,9 +2,13 @@ import asyncio
 
 import click
 import requests
+from prometheus_client import start_http_server
 
-from .context import context
-from .entities import User
+from .config import settings
+from .context import close_app, get_context
+from .entities import RepositoryFilter, User
+from .export import ExportFormat, encode_rows
+from .worker import CrawlWorker
 
 
 @click.group()
@@ -12,12 +16,19 @@ def crawler_cli():
     pass
 
 
+@click.group()
+def worker_cli():
+    pass
+
+
 @crawler_cli.command()
 @click.argument('username')
 def create_task(username: str):
     async def wrapper():
+        context = get_context()
         task_id = await context.user_repositories_usecase.create_task(User(name=username))
         await asyncio.sleep(5)
+        await context.codehub_storage.close()
         print(task_id)
 
     asyncio.run(wrapper())
@@ -27,7 +38,7 @@ def create_task(username: str):
 @click.argument('task_id')
 def get_task(task_id: int):
     async def wrapper():
-        result = await context.user_repositories_usecase.get_task_result(task_id)
+        result = await get_context().user_repositories_usecase.get_task_result(task_id)
         print(result)
 
     asyncio.run(wrapper())
@@ -36,7 +47,50 @@ def get_task(task_id: int):
 @crawler_cli.command()
 def init_database():
     async def wrapper():
-        await context.crawler_storage._create_all()  # type: ignore
+        await get_context().crawler_storage._create_all()  # type: ignore
+
+    asyncio.run(wrapper())
+
+
+@crawler_cli.command()
+def migrate_database():
+    """Creates missing tables, columns and indexes of an existing database."""
+
+    async def wrapper():
+        await get_context().crawler_storage._migrate()  # type: ignore
+
+    asyncio.run(wrapper())
+
+
+@crawler_cli.command()
+@click.option(
+    '--format',
+    'export_format',
+    type=click.Choice([export_format.value for export_format in ExportFormat]),
+    default=ExportFormat.CSV.value,
+    show_default=True,
+)
+@click.option('--output', type=click.File('wb'), default='-', help='File, stdout by default.')
+@click.option('--user', help='Export only this user.')
+@click.option('--min-stars', type=int)
+@click.option('--updated-since', type=click.DateTime(), help='UTC.')
+def export(export_format: str, output, user, min_stars, updated_since):
+    """Exports the stored repositories of all users."""
+    filters = RepositoryFilter(user=user, min_stars=min_stars, updated_since=updated_since)
+    # reads the database only, so the code hub storage and its token aren't needed
+    context = get_context()
+    rows = context.crawler_storage.iter_repository_rows(filters, settings.EXPORT_CHUNK_SIZE)
+    try:
+        chunks = encode_rows(rows, ExportFormat(export_format))
+    except ValueError as e:
+        raise click.UsageError(str(e))
+
+    async def wrapper():
+        try:
+            async for chunk in chunks:
+                output.write(chunk)
+        finally:
+            await close_app()
 
     asyncio.run(wrapper())
 
@@ -48,8 +102,42 @@ def request_create_task(username: str):
     print(resp.json())
 
 
+@crawler_cli.command()
+@click.argument('usernames', type=click.File(), default='-')
+@click.option('--batch-size', default=1000, show_default=True)
+def request_create_tasks(usernames, batch_size: int):
+    """Creates tasks for the usernames listed one per line in a file or stdin."""
+    names = [line.strip() for line in usernames if line.strip()]
+    for start in range(0, len(names), batch_size):
+        users = [{'name': name} for name in names[start : start + batch_size]]
+        resp = requests.post('http://localhost:5000/api/v1/codehub/tasks', json=users)
+        for task_id in resp.json()['task_ids']:
+            print(task_id)
+
+
 @crawler_cli.command()
 @click.argument('id')
 def request_get_task(id: int):
     resp = requests.get('http://localhost:5000/api/v1/codehub/task', {'task_id': id})
     print(resp.json())
+
+
+@worker_cli.command()
+@click.option('--metrics-port', default=settings.WORKER_METRICS_PORT, show_default=True)
+def run(metrics_port: int):
+    """Runs crawl jobs from the SQLite queue until interrupted."""
+    context = get_context()
+    if context.jobs is None:
+        raise click.UsageError('Workers need QUEUE_BACKEND=sqlite')
+    if metrics_port:
+        start_http_server(metrics_port)
+
+    async def wrapper():
+        await context.codehub_storage.open()
+        await context.queue.start()
+        try:
+            await CrawlWorker(context.user_repositories_usecase, context.jobs, settings).run()
+        finally:
+            await close_app()
+
+    asyncio.run(wrapper())
@@ -1,4 +1,19 @@
 import os
+from enum import Enum
+
+
+class CrawlMode(str, Enum):
+    # stars and forks come straight from the repo list payload
+    LIST = 'list'
+    # every repo is re-requested from the detail endpoint
+    DETAIL = 'detail'
+
+
+class QueueBackend(str, Enum):
+    # crawls run on the in-process worker pool of the API server
+    MEMORY = 'memory'
+    # the API only enqueues jobs into SQLite, `cli.py worker run` processes crawl them
+    SQLITE = 'sqlite'
 
 
 class Config:
@@ -7,11 +22,74 @@ class Config:
     REPO_DETAIL_URL: str = '/repos/{username}/{repo_name}'
 
     SQLITE_DB_FILE: str = "database.sqlite"
+    SQLITE_READ_POOL_SIZE: int = 8
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_SYNCHRONOUS: str = 'NORMAL'
+    CRAWL_MODE: CrawlMode = CrawlMode(os.environ.get('CRAWL_MODE') or CrawlMode.LIST)
+    REPO_WRITE_BATCH_SIZE: int = 100
+    # detail requests a single crawl keeps in flight
+    PIPELINE_FETCH_CONCURRENCY: int = 8
+    # capacity of the channels between the list, detail and write stages of a crawl
+    PIPELINE_CHANNEL_SIZE: int = 500
+    # seconds the writer waits for more results before it stores a batch short of the size
+    PIPELINE_WRITE_LINGER: float = 0.5
+    RESULT_PAGE_MAX_LIMIT: int = 1000
+    RESULT_STREAM_CHUNK_SIZE: int = 500
+    EXPORT_CHUNK_SIZE: int = 5000
+    RESULT_CACHE_SIZE: int = 1024
+    RESULT_CACHE_TTL: float = 60.0
+    RESULT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    # a task finished less than this many seconds ago is returned without re-crawling
+    TASK_FRESHNESS_SECONDS: float = float(os.environ.get('TASK_FRESHNESS_SECONDS') or 300)
+    # re-crawls list only repos updated since the previous crawl of the user
+    INCREMENTAL_CRAWL: bool = (os.environ.get('INCREMENTAL_CRAWL') or '1') != '0'
+    BULK_TASK_MAX_USERS: int = 10000
+    # queue priority of bulk created crawls, single task requests run at 0
+    BULK_TASK_PRIORITY: int = 10
 
     GH_BASE_URL: str = 'https://api.github.com'
     GH_REPO_LIST_URL: str = '/users/{username}/repos'
     GH_REPO_DETAIL_URL: str = '/repos/{username}/{repo_name}'
     GH_API_TOKEN: str = os.environ.get('GH_API_TOKEN') or ''
+    # comma separated pool of tokens, requests are spread over them round-robin
+    GH_API_TOKENS: list[str] = [
+        token for token in (os.environ.get('GH_API_TOKENS') or GH_API_TOKEN).split(',') if token
+    ]
+    GH_REQUESTS_PER_SECOND: float = 20.0
+    GH_REQUESTS_BURST: int = 40
+    GH_TOKEN_RESERVE: int = 0
+    GH_PER_PAGE: int = 100
+    GH_PAGE_CONCURRENCY: int = 4
+    GH_HTTP_CACHE_ENABLED: bool = True
+    # cache entries held back until a crawl write takes them along, or written on their own
+    GH_HTTP_CACHE_BUFFER_SIZE: int = 500
+
+    HTTP_CONNECTION_LIMIT: int = 100
+    HTTP_CONNECTION_LIMIT_PER_HOST: int = 30
+    HTTP_KEEPALIVE_TIMEOUT: float = 30.0
+    HTTP_DNS_CACHE_TTL: int = 300
+    HTTP_RETRY_ATTEMPTS: int = 3
+    HTTP_RETRY_BASE_DELAY: float = 0.5
+    HTTP_RETRY_MAX_DELAY: float = 10.0
+
+    QUEUE_CONCURRENCY: int = 32
+    QUEUE_MAX_DEPTH: int = 1000
+    QUEUE_GROUP_TTL: float = 3600.0
+    # pending tasks are read back on startup in batches of this size
+    RESTORE_BATCH_SIZE: int = 500
+    QUEUE_BACKEND: QueueBackend = QueueBackend(
+        os.environ.get('QUEUE_BACKEND') or QueueBackend.MEMORY
+    )
+
+    # crawls a single worker process runs at once
+    WORKER_CONCURRENCY: int = int(os.environ.get('WORKER_CONCURRENCY') or 8)
+    JOB_VISIBILITY_TIMEOUT: float = 60.0
+    JOB_HEARTBEAT_INTERVAL: float = 15.0
+    JOB_POLL_INTERVAL: float = 1.0
+    JOB_MAX_ATTEMPTS: int = 3
+    # crawls run in the workers, so each serves its own /metrics; 0 disables it
+    WORKER_METRICS_PORT: int = int(os.environ.get('WORKER_METRICS_PORT') or 9100)
 
 
 settings = Config()
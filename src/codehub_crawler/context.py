@@ -1,32 +1,122 @@
-from sqlalchemy.ext.asyncio import create_async_engine
+import asyncio
+import math
+from typing import Optional
 
-from common.asyncio_queue import AsyncioQueue
+from common.worker_pool_queue import WorkerPoolQueue
 
-from .config import settings
-from .interfaces import CrawlerStorage
-from .storages.codehub_storage import EmulatorCodeHubStorage, GithubStorage
+from .config import QueueBackend, settings
+from .metrics import CODEHUB_RATE_LIMIT_REMAINING, QUEUE_DEPTH, QUEUE_IN_FLIGHT
+from .interfaces import CodeHubStorage, CrawlerStorage
+from .storages.codehub_storage import GithubStorage
 from .storages.crawler_storage import CrawlerSQLiteStorage
+from .storages.http_cache import SQLiteHTTPCache
+from .storages.job_queue import SQLiteJobQueue
+from .storages.sqlite_engine import SQLiteWriter, create_sqlite_engine
 from .use_cases import UserRepositoriesUseCase
 
 
 class Context:
     def __init__(self) -> None:
-        self.queue = AsyncioQueue()
-        self.crawler_storage: CrawlerStorage = CrawlerSQLiteStorage(
-            engine=create_async_engine(f'sqlite+aiosqlite:///{settings.SQLITE_DB_FILE}')
+        self.queue = WorkerPoolQueue(
+            settings.QUEUE_CONCURRENCY, settings.QUEUE_MAX_DEPTH, settings.QUEUE_GROUP_TTL
         )
-        self.codehub_storage = GithubStorage(settings)
-        # self.codehub_storage = EmulatorCodeHubStorage(settings)
-        self.user_repositories_usecase = UserRepositoriesUseCase(
-            self.crawler_storage, self.codehub_storage, self.queue, settings
+        self.engine = create_sqlite_engine(settings, pool_size=settings.SQLITE_READ_POOL_SIZE)
+        self.sqlite_writer = SQLiteWriter(create_sqlite_engine(settings, pool_size=1))
+        self.crawler_storage: CrawlerStorage = CrawlerSQLiteStorage(self.engine, self.sqlite_writer)
+        self.http_cache = (
+            SQLiteHTTPCache(self.engine, self.sqlite_writer, settings.GH_HTTP_CACHE_BUFFER_SIZE)
+            if settings.GH_HTTP_CACHE_ENABLED
+            else None
         )
+        self.jobs = (
+            SQLiteJobQueue(self.sqlite_writer)
+            if settings.QUEUE_BACKEND == QueueBackend.SQLITE
+            else None
+        )
+        # built on first use, so database only commands run without a GitHub token
+        self._codehub_storage: Optional[CodeHubStorage] = None
+        self._user_repositories_usecase: Optional[UserRepositoriesUseCase] = None
+        self.recovery: Optional[asyncio.Task] = None
+
+    @property
+    def codehub_storage(self) -> CodeHubStorage:
+        if self._codehub_storage is None:
+            self._codehub_storage = GithubStorage(settings, cache=self.http_cache)
+            # or EmulatorCodeHubStorage(settings) from .storages.codehub_storage for the emulator
+            self._register_rate_limit_metrics()
+        return self._codehub_storage
+
+    @property
+    def user_repositories_usecase(self) -> UserRepositoriesUseCase:
+        if self._user_repositories_usecase is None:
+            self._user_repositories_usecase = UserRepositoriesUseCase(
+                self.crawler_storage, self.codehub_storage, self.queue, settings, self.jobs
+            )
+        return self._user_repositories_usecase
+
+    def register_metrics(self) -> None:
+        QUEUE_DEPTH.set_function(lambda: self.queue.depth)
+        QUEUE_IN_FLIGHT.set_function(lambda: self.queue.in_flight)
+
+    def _register_rate_limit_metrics(self) -> None:
+        if not isinstance(self._codehub_storage, GithubStorage):
+            return
+        # tokens are secrets, so they're labelled by their position in GH_API_TOKENS
+        for index, budget in enumerate(self._codehub_storage.rate_limiter.budgets.values()):
+            # NaN until the first response of the token reports it
+            CODEHUB_RATE_LIMIT_REMAINING.labels(index).set_function(
+                lambda b=budget: math.nan if b.remaining is None else b.remaining
+            )
+
+    async def close_codehub_storage(self) -> None:
+        if self._codehub_storage is not None:
+            await self._codehub_storage.close()
 
     def get_user_repositories_usecase(self) -> UserRepositoriesUseCase:
         return self.user_repositories_usecase
 
+    def start_recovery(self) -> None:
+        """Queues the pending tasks of a previous run again while the app already serves."""
+        self.recovery = asyncio.create_task(
+            self.user_repositories_usecase.restore_queue_tasks(), name='restore-queue-tasks'
+        )
+
+    async def stop_recovery(self) -> None:
+        if self.recovery is not None:
+            self.recovery.cancel()
+            await asyncio.gather(self.recovery, return_exceptions=True)
+            self.recovery = None
 
-context = Context()
+
+_context: Optional[Context] = None
+
+
+def get_context() -> Context:
+    """Builds the context on first use, so importing the app creates no engines or sessions."""
+    global _context
+    if _context is None:
+        _context = Context()
+        _context.register_metrics()
+    return _context
+
+
+def get_user_repositories_usecase() -> UserRepositoriesUseCase:
+    return get_context().get_user_repositories_usecase()
 
 
 async def init_app():
-    await context.user_repositories_usecase.restore_queue_tasks()
+    context = get_context()
+    await context.codehub_storage.open()
+    await context.queue.start()
+    context.start_recovery()
+
+
+async def close_app():
+    if _context is None:
+        return
+    context = _context
+    await context.stop_recovery()
+    await context.queue.stop()
+    await context.close_codehub_storage()
+    await context.sqlite_writer.engine.dispose()
+    await context.engine.dispose()
@@ -1,19 +1,26 @@
+from dataclasses import dataclass, field
+from datetime import datetime
 from enum import Enum
 from typing import Optional, TypeAlias
 
-from core.base_entity import BaseEntity
+# Crawl path entities are plain slotted dataclasses: they're built per repository on every
+# hop, so they skip validation. The HTTP boundary validates and documents them in schemas.py.
 
 
-class Repository(BaseEntity):
+@dataclass(slots=True)
+class Repository:
     name: str
     stars: int = 0
     forks: int = 0
+    # last change time reported by the code hub, naive UTC
+    updated_at: Optional[datetime] = None
     # owner: 'User'
 
 
-class User(BaseEntity):
+@dataclass(slots=True)
+class User:
     name: str
-    repositories: list[Repository] = []
+    repositories: list[Repository] = field(default_factory=list)
 
 
 class TaskStatus(str, Enum):
@@ -22,7 +29,95 @@ class TaskStatus(str, Enum):
     FAILED = 'failed'
 
 
-class Task(BaseEntity):
+class RepositorySort(str, Enum):
+    ID = 'id'
+    STARS = 'stars'
+    FORKS = 'forks'
+
+
+@dataclass(slots=True)
+class RepositoryPage:
+    repositories: list[Repository]
+    next_cursor: Optional[str] = None
+
+
+@dataclass(slots=True)
+class RepositoryError:
+    name: str
+    error: str
+
+
+@dataclass(slots=True)
+class StageThroughput:
+    # repositories the stage got through and the seconds from the crawl start to its last one
+    items: int = 0
+    seconds: float = 0.0
+    per_second: float = 0.0
+
+
+@dataclass(slots=True)
+class CrawlThroughput:
+    listed: StageThroughput = field(default_factory=StageThroughput)
+    fetched: StageThroughput = field(default_factory=StageThroughput)
+    written: StageThroughput = field(default_factory=StageThroughput)
+
+
+@dataclass(slots=True)
+class CrawlProgress:
+    listed: bool = False
+    expected: int = 0
+    done: int = 0
+    failed: int = 0
+    # per stage rates of the current or last crawl, as of its last write
+    throughput: Optional[CrawlThroughput] = None
+
+
+@dataclass(slots=True)
+class CrawlBatch:
+    """Everything the writer stage of a crawl stores in one transaction."""
+
+    listed: list[Repository] = field(default_factory=list)
+    # set in list mode, where the listing already has the stats
+    listed_crawled: bool = False
+    # the listing is over, so an interrupted crawl only resumes the details
+    listing_done: bool = False
+    crawled: list[Repository] = field(default_factory=list)
+    errors: list[RepositoryError] = field(default_factory=list)
+    throughput: Optional[CrawlThroughput] = None
+
+
+@dataclass(slots=True)
+class Task:
     id: int
     user: User
     status: TaskStatus = TaskStatus.PENDING
+    progress: CrawlProgress = field(default_factory=CrawlProgress)
+    finished_at: Optional[datetime] = None
+    failed_repositories: list[RepositoryError] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class OwnedRepository:
+    user: str
+    name: str
+    stars: int = 0
+    forks: int = 0
+
+
+@dataclass(slots=True)
+class RepositoryTotals:
+    user: str
+    repositories: int = 0
+    stars: int = 0
+    forks: int = 0
+
+
+@dataclass(slots=True)
+class RepositoryFilter:
+    user: Optional[str] = None
+    min_stars: Optional[int] = None
+    updated_since: Optional[datetime] = None
+
+
+# owner name, repository name, stars, forks, updated_at
+RepositoryRow: TypeAlias = tuple[str, str, int, int, Optional[datetime]]
@@ -0,0 +1,110 @@
+import csv
+import io
+from enum import Enum
+from typing import AsyncIterator
+
+from pydantic_core import to_json
+
+from .entities import RepositoryRow
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # parquet export is optional
+    pyarrow = None
+
+COLUMNS = ('user', 'name', 'stars', 'forks', 'updated_at')
+
+
+class ExportFormat(str, Enum):
+    CSV = 'csv'
+    NDJSON = 'ndjson'
+    PARQUET = 'parquet'
+
+
+MEDIA_TYPES = {
+    ExportFormat.CSV: 'text/csv',
+    ExportFormat.NDJSON: 'application/x-ndjson',
+    ExportFormat.PARQUET: 'application/vnd.apache.parquet',
+}
+
+
+def encode_rows(
+    chunks: AsyncIterator[list[RepositoryRow]], export_format: ExportFormat
+) -> AsyncIterator[bytes]:
+    """Encodes row chunks one by one as they arrive, so memory is bound by a chunk.
+
+    Raises ValueError right away when the format's optional dependency is missing.
+    """
+    if export_format == ExportFormat.CSV:
+        return _encode_csv(chunks)
+    if export_format == ExportFormat.NDJSON:
+        return _encode_ndjson(chunks)
+    if pyarrow is None:
+        raise ValueError('Parquet export needs pyarrow installed')
+    return _encode_parquet(chunks)
+
+
+async def _encode_csv(chunks: AsyncIterator[list[RepositoryRow]]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    async for rows in chunks:
+        writer.writerows(
+            (user, name, stars, forks, updated_at.isoformat() if updated_at else '')
+            for user, name, stars, forks, updated_at in rows
+        )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def _encode_ndjson(chunks: AsyncIterator[list[RepositoryRow]]) -> AsyncIterator[bytes]:
+    async for rows in chunks:
+        yield b''.join(to_json(dict(zip(COLUMNS, row))) + b'\n' for row in rows)
+
+
+class _ParquetSink(io.RawIOBase):
+    """Collects what the parquet writer wrote so far; positions keep counting after a drain."""
+
+    def __init__(self) -> None:
+        self._parts: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b''.join(self._parts)
+        self._parts.clear()
+        return data
+
+
+async def _encode_parquet(chunks: AsyncIterator[list[RepositoryRow]]) -> AsyncIterator[bytes]:
+    schema = pyarrow.schema(
+        [
+            ('user', pyarrow.string()),
+            ('name', pyarrow.string()),
+            ('stars', pyarrow.int64()),
+            ('forks', pyarrow.int64()),
+            ('updated_at', pyarrow.timestamp('us')),
+        ]
+    )
+    sink = _ParquetSink()
+    # every chunk becomes a row group, written out before the next one is read
+    with pyarrow.parquet.ParquetWriter(sink, schema) as writer:
+        async for rows in chunks:
+            columns = {name: [row[i] for row in rows] for i, name in enumerate(COLUMNS)}
+            writer.write_table(pyarrow.Table.from_pydict(columns, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
@@ -1,6 +1,22 @@
 from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import AsyncIterator, Optional
 
-from .entities import Repository, Task, TaskStatus, User
+from .entities import (
+    CrawlBatch,
+    CrawlThroughput,
+    OwnedRepository,
+    Repository,
+    RepositoryError,
+    RepositoryFilter,
+    RepositoryPage,
+    RepositoryRow,
+    RepositorySort,
+    RepositoryTotals,
+    Task,
+    TaskStatus,
+    User,
+)
 
 
 class CrawlerStorage(ABC):
@@ -8,29 +24,160 @@ class CrawlerStorage(ABC):
     async def get_or_create_task(self, user: User) -> tuple[Task, bool]:
         ...
 
+    @abstractmethod
+    async def start_tasks(
+        self, users: list[User], fresh_since: datetime, incremental: bool = True
+    ) -> list[tuple[Task, bool]]:
+        """Gets or creates the tasks of all users in one transaction.
+
+        Tasks that are neither pending nor done after ``fresh_since`` are reset to
+        pending; the flag tells whether the task was (re)started and needs a crawl.
+        """
+
+    @abstractmethod
+    async def restart_task(
+        self, task: Task, fresh_since: datetime, incremental: bool = True
+    ) -> bool:
+        """Resets the task to pending unless it's pending or done after ``fresh_since``.
+
+        Checks and resets in one statement; returns whether this call restarted the task.
+        """
+
     @abstractmethod
     async def get_task(self, task_id: int) -> Task:
+        """Returns the task without its crawl result."""
+
+    @abstractmethod
+    async def find_task(self, task_id: int) -> Optional[Task]:
+        """Like ``get_task``, but returns None for an unknown id."""
+
+    @abstractmethod
+    async def get_task_status(self, task_id: int) -> TaskStatus:
         ...
 
+    @abstractmethod
+    async def get_task_result(self, task_id: int) -> Task:
+        """Returns the task with all repositories of its user and the failed ones."""
+
+    @abstractmethod
+    async def get_task_repositories(
+        self,
+        task_id: int,
+        sort: RepositorySort = RepositorySort.ID,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+    ) -> RepositoryPage:
+        """Returns one keyset-paginated page of the task's repositories.
+
+        Repositories are ordered by id, or by stars/forks descending. Raises
+        ValueError for a cursor that wasn't returned for the same sort.
+        """
+
+    async def iter_task_repositories(
+        self, task_id: int, sort: RepositorySort = RepositorySort.ID, chunk_size: int = 500
+    ) -> AsyncIterator[list[Repository]]:
+        cursor = None
+        while True:
+            page = await self.get_task_repositories(task_id, sort, cursor, chunk_size)
+            if page.repositories:
+                yield page.repositories
+            if page.next_cursor is None:
+                return
+            cursor = page.next_cursor
+
+    @abstractmethod
+    def iter_repository_rows(
+        self, filters: RepositoryFilter, chunk_size: int = 5000
+    ) -> AsyncIterator[list[RepositoryRow]]:
+        """Yields stored repositories of all users matching ``filters`` in id order, in chunks."""
+
+    @abstractmethod
+    async def get_repository_totals(self, user: str) -> Optional[RepositoryTotals]:
+        """Sums the stored repositories of a user; None for an unknown user."""
+
+    @abstractmethod
+    async def get_top_repositories(self, limit: int) -> list[OwnedRepository]:
+        """Returns the ``limit`` most starred stored repositories of all users."""
+
     @abstractmethod
     async def set_task_status(self, task: Task, status: TaskStatus) -> Task:
+        """Sets DONE or FAILED only while the task is pending, PENDING unconditionally."""
+
+    @abstractmethod
+    async def get_pending_tasks(self, after_id: int = 0, limit: Optional[int] = None) -> list[Task]:
+        """Returns pending tasks in id order, starting after ``after_id``."""
+
+    @abstractmethod
+    async def get_last_task_id(self) -> int:
         ...
 
     @abstractmethod
-    async def get_pending_tasks(self) -> list[Task]:
+    async def reset_task_progress(self, task: Task, incremental: bool = True) -> None:
+        """Starts a new crawl: zeroes the task counters and marks its repos uncrawled.
+
+        An incremental reset keeps the repos crawled while the task has a watermark,
+        only repos listed again by the new crawl are processed.
+        """
+
+    @abstractmethod
+    async def get_crawl_watermark(self, task_id: int) -> Optional[datetime]:
         ...
 
     @abstractmethod
-    async def update_or_create_repository(
-        self, repo: Repository, owner: User
-    ) -> tuple[Repository, bool]:
+    async def save_crawl_batch(self, task: Task, batch: CrawlBatch) -> None:
+        """Stores what the writer stage gathered and updates the task counters, in one transaction.
+
+        Listed repos count as expected, and as done if ``listed_crawled``; crawled repos count as
+        done and errors as failed.
+        """
+
+    @abstractmethod
+    async def get_unfinished_repositories(self, task_id: int) -> list[str]:
+        """Returns names of listed repos that are neither crawled nor failed."""
+
+    @abstractmethod
+    async def complete_crawl(self, task: Task, throughput: Optional[CrawlThroughput]) -> bool:
+        """Marks a still pending task done and stores its watermark and final throughput.
+
+        The watermark is the ``updated_at`` the next incremental crawl lists repos from.
+        Returns False if the task left PENDING meanwhile.
+        """
+
+    @abstractmethod
+    async def get_repository_errors(self, task_id: int) -> list[RepositoryError]:
         ...
 
+    @abstractmethod
+    async def retry_repository_errors(self, task_id: int) -> int:
+        """Sets a task with repository errors PENDING again and clears the errors.
+
+        The check and the update are one conditional UPDATE, so of concurrent retries or
+        restarts of a task only one succeeds. Returns the number of errors cleared, 0 if the
+        task is pending or has none.
+        """
+
 
 class CodeHubStorage(ABC):
+    async def open(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
     @abstractmethod
+    def iter_user_repos(
+        self, user: User, updated_since: Optional[datetime] = None
+    ) -> AsyncIterator[list[Repository]]:
+        """Yields the user's repositories page by page, as soon as each page arrives.
+
+        With ``updated_since`` only repositories updated at or after it are yielded.
+        """
+
     async def get_user_repos(self, user: User) -> list[Repository]:
-        ...
+        repos = []
+        async for page in self.iter_user_repos(user):
+            repos.extend(page)
+        return repos
 
     @abstractmethod
     async def get_repo_data(self, owner: User, repo: Repository) -> Repository:
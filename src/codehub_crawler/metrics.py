@@ -0,0 +1,33 @@
+from prometheus_client import Gauge, Histogram
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CODEHUB_REQUEST_SECONDS = Histogram(
+    'codehub_request_duration_seconds',
+    'Code hub API request latency, body included.',
+    ['endpoint', 'status'],
+    buckets=LATENCY_BUCKETS,
+)
+CODEHUB_RATE_LIMIT_REMAINING = Gauge(
+    'codehub_rate_limit_remaining',
+    'Requests left for an API token as last reported by the code hub.',
+    ['token'],
+)
+SQLITE_WRITE_SECONDS = Histogram(
+    'sqlite_write_transaction_duration_seconds',
+    'Duration of SQLite write transactions, waiting for the writer excluded.',
+    buckets=LATENCY_BUCKETS,
+)
+SQLITE_WRITER_WAIT_SECONDS = Histogram(
+    'sqlite_writer_wait_seconds',
+    'Time write transactions wait for the single writer connection.',
+    buckets=LATENCY_BUCKETS,
+)
+QUEUE_DEPTH = Gauge('crawl_queue_depth', 'Coroutines waiting in the crawl queue.')
+QUEUE_IN_FLIGHT = Gauge('crawl_queue_in_flight', 'Coroutines running on the crawl queue.')
+TASK_DURATION_SECONDS = Histogram(
+    'crawl_task_duration_seconds',
+    'Time a task takes from PENDING to DONE or FAILED, queue wait included.',
+    ['status'],
+    buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0),
+)
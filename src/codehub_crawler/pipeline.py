@@ -0,0 +1,171 @@
+import asyncio
+import time
+from typing import AsyncIterator, Awaitable, Callable, Optional, Union
+
+from .config import Config
+from .entities import (
+    CrawlBatch,
+    CrawlThroughput,
+    Repository,
+    RepositoryError,
+    StageThroughput,
+    Task,
+)
+from .interfaces import CodeHubStorage
+
+# sent by the list producer to the writer once every listed page is in the channel
+_LISTING_DONE = object()
+
+# a listed page, a crawled repo, a failed one, _LISTING_DONE, or None once the channel is closed
+_Result = Union[list[Repository], Repository, RepositoryError, object, None]
+
+
+class _StageMeter:
+    def __init__(self, started: float) -> None:
+        self.started = started
+        self.items = 0
+        self.last = started
+
+    def add(self, items: int) -> None:
+        self.items += items
+        self.last = time.monotonic()
+
+    def snapshot(self) -> StageThroughput:
+        seconds = self.last - self.started
+        per_second = self.items / seconds if seconds > 0 else 0.0
+        return StageThroughput(
+            items=self.items, seconds=round(seconds, 3), per_second=round(per_second, 1)
+        )
+
+
+class CrawlPipeline:
+    """Crawls one task as three stages joined by bounded channels.
+
+    The list producer reads repo pages from ``pages``, ``PIPELINE_FETCH_CONCURRENCY``
+    fetchers request details of the listed repos and a single writer stores what
+    arrived within ``PIPELINE_WRITE_LINGER`` seconds of the first result, up to
+    ``REPO_WRITE_BATCH_SIZE`` repos in one transaction. So listing, fetching and
+    writing overlap, and the writer is the only stage touching the database. Each
+    stage closes the channel after it once it's done, ``run`` returns when the writer
+    stored the last batch and raises if any stage failed.
+    """
+
+    def __init__(
+        self,
+        task: Task,
+        pages: AsyncIterator[list[Repository]],
+        remote: CodeHubStorage,
+        write: Callable[[Task, CrawlBatch], Awaitable[None]],
+        config: Config,
+        listing: bool,
+        fetch_details: bool,
+    ) -> None:
+        self.task = task
+        self.pages = pages
+        self.remote = remote
+        self.write = write
+        self.batch_size = config.REPO_WRITE_BATCH_SIZE
+        self.write_linger = config.PIPELINE_WRITE_LINGER
+        # a new listing is stored too, repos to resume are only fetched
+        self.listing = listing
+        self.fetch_details = fetch_details
+        self.started = time.monotonic()
+        self.listed = _StageMeter(self.started)
+        self.fetched = _StageMeter(self.started)
+        self.written = _StageMeter(self.started)
+        self._fetchers = config.PIPELINE_FETCH_CONCURRENCY if fetch_details else 0
+        self._names: asyncio.Queue[Optional[str]] = asyncio.Queue(config.PIPELINE_CHANNEL_SIZE)
+        self._results: asyncio.Queue[_Result] = asyncio.Queue(config.PIPELINE_CHANNEL_SIZE)
+
+    async def run(self) -> None:
+        async with asyncio.TaskGroup() as stages:
+            stages.create_task(self._list())
+            for _ in range(self._fetchers):
+                stages.create_task(self._fetch())
+            stages.create_task(self._write())
+
+    def throughput(self) -> CrawlThroughput:
+        return CrawlThroughput(
+            listed=self.listed.snapshot(),
+            fetched=self.fetched.snapshot(),
+            written=self.written.snapshot(),
+        )
+
+    async def _list(self) -> None:
+        async for repos in self.pages:
+            self.listed.add(len(repos))
+            # the page goes first, so the writer stores it before any of its details
+            if self.listing:
+                await self._results.put(repos)
+            if self.fetch_details:
+                for repo in repos:
+                    await self._names.put(repo.name)
+        if self.listing:
+            await self._results.put(_LISTING_DONE)
+
+        if not self.fetch_details:
+            await self._results.put(None)
+        for _ in range(self._fetchers):
+            await self._names.put(None)
+
+    async def _fetch(self) -> None:
+        while (name := await self._names.get()) is not None:
+            try:
+                result = await self.remote.get_repo_data(self.task.user, Repository(name=name))
+            except Exception as e:
+                # one broken repository doesn't fail the crawl, it can be retried on its own
+                result = RepositoryError(name=name, error=str(e) or repr(e))
+            self.fetched.add(1)
+            await self._results.put(result)
+
+        self._fetchers -= 1
+        if not self._fetchers:
+            await self._results.put(None)
+
+    async def _write(self) -> None:
+        closed = False
+        while not closed:
+            batch = CrawlBatch(listed_crawled=not self.fetch_details)
+            size = 0
+            result = await self._results.get()
+            # waits a little for more, so a slow fetch stage still writes in batches
+            deadline = time.monotonic() + self.write_linger
+            while True:
+                if result is None:
+                    closed = True
+                    break
+                size += self._add_to_batch(batch, result)
+                if size >= self.batch_size:
+                    break
+                if not self._results.empty():
+                    result = self._results.get_nowait()
+                    continue
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    result = await asyncio.wait_for(self._results.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+
+            if size or batch.listing_done:
+                written = len(batch.crawled) + len(batch.errors)
+                if batch.listed_crawled:
+                    written += len(batch.listed)
+                self.written.add(written)
+                batch.throughput = self.throughput()
+                await self.write(self.task, batch)
+
+    @staticmethod
+    def _add_to_batch(batch: CrawlBatch, result: _Result) -> int:
+        if result is _LISTING_DONE:
+            batch.listing_done = True
+            return 0
+        if isinstance(result, list):
+            batch.listed.extend(result)
+            return len(result)
+        if isinstance(result, RepositoryError):
+            batch.errors.append(result)
+        else:
+            batch.crawled.append(result)
+        return 1
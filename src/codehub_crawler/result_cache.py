@@ -0,0 +1,50 @@
+import hashlib
+from dataclasses import dataclass
+from typing import Optional
+
+from pydantic_core import to_json
+
+from common.ttl_cache import TTLCache
+
+from .entities import Task
+
+
+@dataclass(frozen=True)
+class TaskResultDocument:
+    etag: str
+    body: bytes
+
+
+class TaskResultCache:
+    """Serialised task results keyed by task id.
+
+    The use case invalidates a task whenever it writes its status, repositories
+    or errors. A result read from the database while any invalidation happened
+    is returned but not cached, so a stale document is never stored. Bodies take at
+    most ``maxbytes`` together, the results of big users can be megabytes each.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, maxbytes: int) -> None:
+        self._documents: TTLCache[int, TaskResultDocument] = TTLCache(
+            maxsize, ttl, maxweight=maxbytes, weigh=lambda document: len(document.body)
+        )
+        self.epoch = 0
+
+    def get(self, task_id: int) -> Optional[TaskResultDocument]:
+        return self._documents.get(task_id)
+
+    def render(self, task: Task) -> TaskResultDocument:
+        body = to_json(task)
+        # a hash of the body, so an unchanged result keeps its etag across renders and processes
+        etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        return TaskResultDocument(etag=etag, body=body)
+
+    def put(self, task: Task, epoch: int) -> TaskResultDocument:
+        document = self.render(task)
+        if epoch == self.epoch:
+            self._documents.set(task.id, document)
+        return document
+
+    def invalidate(self, task_id: int) -> None:
+        self.epoch += 1
+        self._documents.pop(task_id)
@@ -1,21 +1,105 @@
-from typing import Annotated
+from datetime import datetime
+from typing import Annotated, AsyncIterator, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from pydantic_core import to_json
 
-from .context import context, init_app
-from .entities import Task, User
+from .config import settings
+from .context import get_user_repositories_usecase
+from .entities import RepositoryFilter, RepositorySort
+from .export import MEDIA_TYPES, ExportFormat, encode_rows
+from .schemas import OwnedRepository, RepositoryPage, RepositoryTotals, Task, User
 from .use_cases import UserRepositoriesUseCase
 
 router = APIRouter()
-router.on_startup.append(init_app)
 
-UserReposDeps = Annotated[UserRepositoriesUseCase, Depends(context.get_user_repositories_usecase)]
+UserReposDeps = Annotated[UserRepositoriesUseCase, Depends(get_user_repositories_usecase)]
 
 
 @router.get('/task', response_model=Task)
-async def get_task(task_id: int, usecase: UserReposDeps) -> Task:
-    task = await usecase.get_task_result(task_id)
-    return task
+async def get_task(
+    task_id: int,
+    usecase: UserReposDeps,
+    if_none_match: Annotated[Optional[str], Header()] = None,
+) -> Response:
+    document = await usecase.get_task_result_document(task_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail='Unknown task')
+    headers = {'ETag': document.etag}
+    if if_none_match == document.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=document.body, media_type='application/json', headers=headers)
+
+
+@router.get('/task/repositories', response_model=RepositoryPage)
+async def get_task_repositories(
+    task_id: int,
+    usecase: UserReposDeps,
+    sort: RepositorySort = RepositorySort.ID,
+    cursor: Optional[str] = None,
+    limit: Annotated[int, Query(ge=1, le=settings.RESULT_PAGE_MAX_LIMIT)] = 100,
+) -> Response:
+    try:
+        page = await usecase.get_task_repositories(task_id, sort, cursor, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+    # a page of a known task is never empty but past its end, unknown ids are told apart then
+    if not page.repositories and await usecase.find_task(task_id) is None:
+        raise HTTPException(status_code=404, detail='Unknown task')
+    return Response(content=to_json(page), media_type='application/json')
+
+
+@router.get('/task/stream')
+async def stream_task(
+    task_id: int, usecase: UserReposDeps, sort: RepositorySort = RepositorySort.ID
+) -> StreamingResponse:
+    """Streams the task as NDJSON: the task itself first, then one repository per line."""
+    task = await usecase.find_task(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail='Unknown task')
+
+    async def lines() -> AsyncIterator[bytes]:
+        yield to_json(task) + b'\n'
+        async for repos in usecase.iter_task_repositories(task_id, sort):
+            yield b''.join(to_json(repo) + b'\n' for repo in repos)
+
+    return StreamingResponse(lines(), media_type='application/x-ndjson')
+
+
+@router.get('/export')
+async def export_repositories(
+    usecase: UserReposDeps,
+    format: ExportFormat = ExportFormat.CSV,
+    user: Optional[str] = None,
+    min_stars: Annotated[Optional[int], Query(ge=0)] = None,
+    updated_since: Optional[datetime] = None,
+) -> StreamingResponse:
+    """Streams the stored repositories of all users; ``updated_since`` is UTC."""
+    filters = RepositoryFilter(user=user, min_stars=min_stars, updated_since=updated_since)
+    try:
+        body = encode_rows(usecase.iter_repository_rows(filters), format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {'Content-Disposition': f'attachment; filename="repositories.{format.value}"'}
+    return StreamingResponse(body, media_type=MEDIA_TYPES[format], headers=headers)
+
+
+@router.get('/user/totals', response_model=RepositoryTotals)
+async def get_user_totals(user: str, usecase: UserReposDeps) -> Response:
+    totals = await usecase.get_repository_totals(user)
+    if totals is None:
+        raise HTTPException(status_code=404, detail='Unknown user')
+    return Response(content=to_json(totals), media_type='application/json')
+
+
+@router.get('/repositories/top', response_model=list[OwnedRepository])
+async def get_top_repositories(
+    usecase: UserReposDeps,
+    limit: Annotated[int, Query(ge=1, le=settings.RESULT_PAGE_MAX_LIMIT)] = 10,
+) -> Response:
+    repos = await usecase.get_top_repositories(limit)
+    return Response(content=to_json(repos), media_type='application/json')
 
 
 @router.post('/task')
@@ -23,5 +107,22 @@ async def create_task(
     user: User,
     usecase: UserReposDeps,
 ):
-    task_id = await usecase.create_task(user)
+    task_id = await usecase.create_task(user.to_entity())
     return {'task_id': task_id}
+
+
+@router.post('/tasks')
+async def create_tasks(
+    users: Annotated[list[User], Body(min_length=1, max_length=settings.BULK_TASK_MAX_USERS)],
+    usecase: UserReposDeps,
+):
+    task_ids = await usecase.create_tasks([user.to_entity() for user in users])
+    return {'task_ids': task_ids}
+
+
+@router.post('/task/retry')
+async def retry_task(task_id: int, usecase: UserReposDeps):
+    if await usecase.find_task(task_id) is None:
+        raise HTTPException(status_code=404, detail='Unknown task')
+    retried = await usecase.retry_failed_repositories(task_id)
+    return {'task_id': task_id, 'retried_repositories': retried}
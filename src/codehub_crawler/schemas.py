@@ -0,0 +1,75 @@
+from datetime import datetime
+from typing import Optional
+
+from core.base_entity import BaseEntity
+
+from . import entities
+from .entities import TaskStatus
+
+
+class Repository(BaseEntity):
+    name: str
+    stars: int = 0
+    forks: int = 0
+    updated_at: Optional[datetime] = None
+
+
+class User(BaseEntity):
+    name: str
+    repositories: list[Repository] = []
+
+    def to_entity(self) -> entities.User:
+        return entities.User(name=self.name)
+
+
+class RepositoryPage(BaseEntity):
+    repositories: list[Repository]
+    next_cursor: Optional[str] = None
+
+
+class RepositoryError(BaseEntity):
+    name: str
+    error: str
+
+
+class StageThroughput(BaseEntity):
+    items: int = 0
+    seconds: float = 0.0
+    per_second: float = 0.0
+
+
+class CrawlThroughput(BaseEntity):
+    listed: StageThroughput = StageThroughput()
+    fetched: StageThroughput = StageThroughput()
+    written: StageThroughput = StageThroughput()
+
+
+class CrawlProgress(BaseEntity):
+    listed: bool = False
+    expected: int = 0
+    done: int = 0
+    failed: int = 0
+    throughput: Optional[CrawlThroughput] = None
+
+
+class Task(BaseEntity):
+    id: int
+    user: User
+    status: TaskStatus = TaskStatus.PENDING
+    progress: CrawlProgress = CrawlProgress()
+    finished_at: Optional[datetime] = None
+    failed_repositories: list[RepositoryError] = []
+
+
+class OwnedRepository(BaseEntity):
+    user: str
+    name: str
+    stars: int = 0
+    forks: int = 0
+
+
+class RepositoryTotals(BaseEntity):
+    user: str
+    repositories: int = 0
+    stars: int = 0
+    forks: int = 0
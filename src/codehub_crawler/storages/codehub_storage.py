@@ -1,77 +1,357 @@
-from typing import Protocol
+import asyncio
+import random
+import time
+from abc import abstractmethod
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Protocol, TypeVar
+from urllib.parse import urlencode
 
 import aiohttp
 
 from codehub_crawler.entities import Repository, User
 from codehub_crawler.interfaces import CodeHubStorage
+from codehub_crawler.metrics import CODEHUB_REQUEST_SECONDS
+from codehub_crawler.storages.http_cache import CachedResponse, HTTPCache
+from codehub_crawler.storages.rate_limiter import RateLimiter
 
+T = TypeVar('T')
 
-class CodeHubStorageConfiguration(Protocol):
+TRANSIENT_ERRORS = (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError)
+# newest first, so an incremental listing stops at the first repo older than the watermark
+UPDATED_ORDER = {'sort': 'updated', 'direction': 'desc'}
+
+
+class HTTPSessionConfiguration(Protocol):
+    HTTP_CONNECTION_LIMIT: int
+    HTTP_CONNECTION_LIMIT_PER_HOST: int
+    HTTP_KEEPALIVE_TIMEOUT: float
+    HTTP_DNS_CACHE_TTL: int
+    HTTP_RETRY_ATTEMPTS: int
+    HTTP_RETRY_BASE_DELAY: float
+    HTTP_RETRY_MAX_DELAY: float
+
+
+class PooledSessionStorage(CodeHubStorage):
+    """Keeps one long-lived aiohttp session per storage instance.
+
+    The session is opened on app startup (or lazily on first request) and
+    reuses keep-alive connections, so repeated calls skip the TCP/TLS handshake.
+    """
+
+    def __init__(self, config: HTTPSessionConfiguration):
+        self.http_config = config
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @abstractmethod
+    def base_url(self) -> str:
+        ...
+
+    def headers(self) -> dict[str, str]:
+        return {}
+
+    async def open(self) -> None:
+        if self._session is not None and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.http_config.HTTP_CONNECTION_LIMIT,
+            limit_per_host=self.http_config.HTTP_CONNECTION_LIMIT_PER_HOST,
+            keepalive_timeout=self.http_config.HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=self.http_config.HTTP_DNS_CACHE_TTL,
+        )
+        self._session = aiohttp.ClientSession(
+            self.base_url(), headers=self.headers(), connector=connector
+        )
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            await self.open()
+        assert self._session is not None
+        return self._session
+
+    @asynccontextmanager
+    async def request(
+        self, endpoint: str, url: str, **kwargs: Any
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """GETs ``url``, recording the latency under ``endpoint`` and the response status."""
+        session = await self.session()
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            async with session.get(url, **kwargs) as response:
+                status = str(response.status)
+                yield response
+        finally:
+            CODEHUB_REQUEST_SECONDS.labels(endpoint, status).observe(time.perf_counter() - started)
+
+    async def with_retries(self, request: Callable[[], Awaitable[T]]) -> T:
+        """Retries an idempotent request on connection errors and 5xx answers.
+
+        Delays grow exponentially with full jitter, so retries of many
+        concurrent requests don't hit the server at the same moment.
+        """
+        attempt = 0
+        while True:
+            try:
+                return await request()
+            except aiohttp.ClientResponseError as e:
+                if e.status < 500 or attempt >= self.http_config.HTTP_RETRY_ATTEMPTS:
+                    raise
+            except TRANSIENT_ERRORS:
+                if attempt >= self.http_config.HTTP_RETRY_ATTEMPTS:
+                    raise
+            delay = min(
+                self.http_config.HTTP_RETRY_BASE_DELAY * 2**attempt,
+                self.http_config.HTTP_RETRY_MAX_DELAY,
+            )
+            await asyncio.sleep(random.uniform(0, delay))
+            attempt += 1
+
+
+class CodeHubStorageConfiguration(HTTPSessionConfiguration, Protocol):
     BASE_URL: str
     REPO_LIST_URL: str
     REPO_DETAIL_URL: str
 
 
-class EmulatorCodeHubStorage(CodeHubStorage):
+class EmulatorCodeHubStorage(PooledSessionStorage):
     def __init__(self, config: CodeHubStorageConfiguration):
+        super().__init__(config)
         self.config = config
 
-    async def get_user_repos(self, user: User) -> list[Repository]:
-        async with aiohttp.ClientSession(self.config.BASE_URL) as session:
-            async with session.get(
-                self.config.REPO_LIST_URL.format(username=user.name)
-            ) as response:
-                response.raise_for_status()
-                repos = await response.json()
-                return [Repository(name=repo) for repo in repos]
+    def base_url(self) -> str:
+        return self.config.BASE_URL
+
+    async def iter_user_repos(
+        self, user: User, updated_since: Optional[datetime] = None
+    ) -> AsyncIterator[list[Repository]]:
+        # the emulator paginates like GitHub, pages are followed one by one
+        url: Optional[str] = self.config.REPO_LIST_URL.format(username=user.name)
+        if updated_since is not None:
+            url = f'{url}?{urlencode(UPDATED_ORDER)}'
+        while url is not None:
+            repos, url = await self.with_retries(lambda: self._get('repo_list', url))
+            page = [self._parse_repo(repo) for repo in repos]
+            if updated_since is not None:
+                page = _updated_since(page, updated_since)
+                if len(page) < len(repos):
+                    url = None
+            yield page
 
     async def get_repo_data(self, owner: User, repo: Repository) -> Repository:
-        async with aiohttp.ClientSession(self.config.BASE_URL) as session:
-            async with session.get(
-                self.config.REPO_DETAIL_URL.format(username=owner.name, repo_name=repo.name)
-            ) as response:
-                response.raise_for_status()
-                repo_data = await response.json()
-                return Repository(
-                    name=repo_data["name"], stars=repo_data["stars"], forks=repo_data["forks"]
-                )
-
-
-class GithubStorageConfiguration(Protocol):
+        repo_data, _ = await self.with_retries(
+            lambda: self._get(
+                'repo_detail',
+                self.config.REPO_DETAIL_URL.format(username=owner.name, repo_name=repo.name),
+            )
+        )
+        return self._parse_repo(repo_data)
+
+    async def _get(self, endpoint: str, url: str) -> tuple[Any, Optional[str]]:
+        """Returns the payload and the URL of the next page, if any."""
+        async with self.request(endpoint, url) as response:
+            response.raise_for_status()
+            next_link = response.links.get('next')
+            # relative, the pooled session joins it with the base url
+            return await response.json(), next_link['url'].path_qs if next_link else None
+
+    @staticmethod
+    def _parse_repo(repo_data: dict) -> Repository:
+        return Repository(
+            name=repo_data['name'],
+            stars=repo_data['stargazers_count'],
+            forks=repo_data['forks_count'],
+            updated_at=_parse_time(repo_data.get('updated_at')),
+        )
+
+
+class GithubStorageConfiguration(HTTPSessionConfiguration, Protocol):
     GH_BASE_URL: str
     GH_REPO_LIST_URL: str
     GH_REPO_DETAIL_URL: str
-    GH_API_TOKEN: str
+    GH_API_TOKENS: list[str]
+    GH_REQUESTS_PER_SECOND: float
+    GH_REQUESTS_BURST: int
+    GH_TOKEN_RESERVE: int
+    GH_PER_PAGE: int
+    GH_PAGE_CONCURRENCY: int
 
 
-class GithubStorage(CodeHubStorage):
-    def __init__(self, config: GithubStorageConfiguration):
+class GithubStorage(PooledSessionStorage):
+    def __init__(
+        self,
+        config: GithubStorageConfiguration,
+        cache: Optional[HTTPCache] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+    ):
+        super().__init__(config)
         self.config = config
-        if self.config.GH_API_TOKEN == '':
+        self.cache = cache
+        if not self.config.GH_API_TOKENS:
             raise ValueError('Github API token is empty')
+        self.rate_limiter = rate_limiter or RateLimiter(
+            self.config.GH_API_TOKENS,
+            self.config.GH_REQUESTS_PER_SECOND,
+            self.config.GH_REQUESTS_BURST,
+            self.config.GH_TOKEN_RESERVE,
+        )
 
-    async def get_user_repos(self, user: User) -> list[Repository]:
-        async with self.session() as session:
-            async with session.get(
-                self.config.GH_REPO_LIST_URL.format(username=user.name)
-            ) as response:
-                response.raise_for_status()
-                repos = await response.json()
-                return [Repository(name=repo['name']) for repo in repos]
+    def base_url(self) -> str:
+        return self.config.GH_BASE_URL
+
+    async def close(self) -> None:
+        if self.cache is not None:
+            await self.cache.flush()
+        await super().close()
+
+    async def iter_user_repos(
+        self, user: User, updated_since: Optional[datetime] = None
+    ) -> AsyncIterator[list[Repository]]:
+        url = self.config.GH_REPO_LIST_URL.format(username=user.name)
+        if updated_since is not None:
+            # pages are fetched in order until one reaches past the watermark
+            page = 1
+            while page:
+                repos, links = await self._get_repo_page(url, page, UPDATED_ORDER)
+                newer = _updated_since(repos, updated_since)
+                yield newer
+                page = links.get('next', 0) if len(newer) == len(repos) else 0
+            return
+
+        repos, links = await self._get_repo_page(url, 1)
+        yield repos
+
+        if 'last' in links:
+            async for repos in self._get_repo_pages(url, range(2, links['last'] + 1)):
+                yield repos
+        else:
+            while 'next' in links:
+                repos, links = await self._get_repo_page(url, links['next'])
+                yield repos
 
     async def get_repo_data(self, owner: User, repo: Repository) -> Repository:
-        async with self.session() as session:
-            async with session.get(
-                self.config.GH_REPO_DETAIL_URL.format(username=owner.name, repo_name=repo.name)
-            ) as response:
-                response.raise_for_status()
-                repo_data = await response.json()
-                return Repository(
-                    name=repo_data["name"],
-                    stars=repo_data["stargazers_count"],
-                    forks=repo_data["forks_count"],
-                )
-
-    def session(self):
-        headers = {'Authorization': f'Bearer {self.config.GH_API_TOKEN}'}
-        return aiohttp.ClientSession(self.config.GH_BASE_URL, headers=headers)
+        url = self.config.GH_REPO_DETAIL_URL.format(username=owner.name, repo_name=repo.name)
+        repo_data = await self._get('repo_detail', url, parse=lambda data, _: self._trim_repo(data))
+        return self._parse_repo(repo_data)
+
+    async def _get_repo_pages(self, url: str, pages: range) -> AsyncIterator[list[Repository]]:
+        semaphore = asyncio.Semaphore(self.config.GH_PAGE_CONCURRENCY)
+
+        async def fetch(page: int) -> list[Repository]:
+            async with semaphore:
+                repos, _ = await self._get_repo_page(url, page)
+                return repos
+
+        tasks = [asyncio.create_task(fetch(page)) for page in pages]
+        try:
+            for page_done in asyncio.as_completed(tasks):
+                yield await page_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _get_repo_page(
+        self, url: str, page: int, order: Optional[dict[str, str]] = None
+    ) -> tuple[list[Repository], dict[str, int]]:
+        """Returns the repos of one page and the page numbers from its ``Link`` header."""
+
+        def parse(repos: list[dict], response: aiohttp.ClientResponse) -> dict:
+            links = {
+                str(rel): int(link['url'].query['page'])
+                for rel, link in response.links.items()
+                if 'page' in link['url'].query
+            }
+            return {'repos': [self._trim_repo(repo) for repo in repos], 'links': links}
+
+        params = {'per_page': self.config.GH_PER_PAGE, 'page': page, **(order or {})}
+        page_data = await self._get('repo_list', url, params, parse)
+        return [self._parse_repo(repo) for repo in page_data['repos']], page_data['links']
+
+    async def _get(
+        self,
+        endpoint: str,
+        url: str,
+        params: Optional[dict[str, Any]] = None,
+        parse: Callable[[Any, aiohttp.ClientResponse], Any] = lambda data, _: data,
+    ) -> Any:
+        """GETs ``url`` and returns the parsed payload.
+
+        With a cache configured the request is conditional; a 304 answer returns
+        the payload parsed from the last 200 and doesn't count against the rate limit.
+        Rate limited responses are retried once the rate limiter lets them through,
+        transient failures are retried with backoff.
+        """
+        key = f'{url}?{urlencode(sorted(params.items()))}' if params else url
+        cached = await self.cache.get(key) if self.cache is not None else None
+        headers = {}
+        if cached is not None and cached.etag:
+            headers['If-None-Match'] = cached.etag
+        if cached is not None and cached.last_modified:
+            headers['If-Modified-Since'] = cached.last_modified
+
+        async def send() -> tuple[Any, Optional[str], Optional[str]]:
+            while True:
+                token = await self.rate_limiter.acquire()
+                headers['Authorization'] = f'Bearer {token}'
+                async with self.request(endpoint, url, params=params, headers=headers) as response:
+                    if self.rate_limiter.update(token, response.status, response.headers):
+                        continue
+                    if response.status == 304 and cached is not None:
+                        return cached.payload, None, None
+                    response.raise_for_status()
+                    return (
+                        parse(await response.json(), response),
+                        response.headers.get('ETag'),
+                        response.headers.get('Last-Modified'),
+                    )
+
+        payload, etag, last_modified = await self.with_retries(send)
+        if self.cache is not None and (etag or last_modified):
+            response = CachedResponse(payload, etag, last_modified)
+            # a 304, or a 200 of the same content, leaves nothing new to store
+            if response != cached:
+                await self.cache.set(key, response)
+        return payload
+
+    @staticmethod
+    def _trim_repo(repo_data: dict) -> dict:
+        return {
+            'name': repo_data['name'],
+            'stargazers_count': repo_data['stargazers_count'],
+            'forks_count': repo_data['forks_count'],
+            'updated_at': repo_data.get('updated_at'),
+        }
+
+    @staticmethod
+    def _parse_repo(repo_data: dict) -> Repository:
+        return Repository(
+            name=repo_data['name'],
+            stars=repo_data['stargazers_count'],
+            forks=repo_data['forks_count'],
+            updated_at=_parse_time(repo_data.get('updated_at')),
+        )
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    """Parses an ISO 8601 timestamp to naive UTC."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _updated_since(repos: list[Repository], since: datetime) -> list[Repository]:
+    """Takes the leading repos of a newest first page updated at or after ``since``."""
+    newer = []
+    for repo in repos:
+        if repo.updated_at is None or repo.updated_at < since:
+            break
+        newer.append(repo)
+    return newer
@@ -1,9 +1,48 @@
-from sqlalchemy import ForeignKey, UniqueConstraint, select
+from dataclasses import asdict
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import (
+    JSON,
+    Connection,
+    ForeignKey,
+    UniqueConstraint,
+    and_,
+    delete,
+    false,
+    func,
+    inspect,
+    not_,
+    or_,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncAttrs, AsyncEngine, AsyncSession, async_sessionmaker
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-
-from codehub_crawler.entities import Repository, Task, TaskStatus, User
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship, selectinload
+from sqlalchemy.schema import CreateColumn
+
+from codehub_crawler.entities import (
+    CrawlBatch,
+    CrawlProgress,
+    CrawlThroughput,
+    OwnedRepository,
+    Repository,
+    RepositoryError,
+    RepositoryFilter,
+    RepositoryPage,
+    RepositoryRow,
+    RepositorySort,
+    RepositoryTotals,
+    StageThroughput,
+    Task,
+    TaskStatus,
+    User,
+)
 from codehub_crawler.interfaces import CrawlerStorage
+from codehub_crawler.metrics import TASK_DURATION_SECONDS
+from codehub_crawler.storages.sqlite_engine import SQLiteWriter
 
 
 class Base(AsyncAttrs, DeclarativeBase):
@@ -15,11 +54,12 @@ class DBUser(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(unique=True)
-    repositories: Mapped[list["DBRepository"]] = relationship(
-        back_populates="owner", lazy='immediate'
-    )
+    # never loaded implicitly: a user may own tens of thousands of repositories
+    repositories: Mapped[list["DBRepository"]] = relationship(back_populates="owner", lazy='raise')
 
-    def to_dto(self) -> User:
+    def to_dto(self, with_repositories: bool = False) -> User:
+        if not with_repositories:
+            return User(name=self.name)
         return User(name=self.name, repositories=[repo.to_dto() for repo in self.repositories])
 
     @classmethod
@@ -33,129 +73,613 @@ class DBRepository(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str]
-    stars: Mapped[int] = mapped_column(default=0)
+    # indexed for the global top repositories, ties are broken by id in index order
+    stars: Mapped[int] = mapped_column(default=0, index=True)
     forks: Mapped[int] = mapped_column(default=0)
+    # set once the repository is processed by the current crawl of its owner
+    crawled: Mapped[bool] = mapped_column(default=False, server_default=false())
+    updated_at: Mapped[Optional[datetime]] = mapped_column(default=None)
     owner: Mapped["DBUser"] = relationship(back_populates="repositories")
     owner_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
 
     def to_dto(self) -> Repository:
-        return Repository(name=self.name, stars=self.stars, forks=self.forks)
+        return Repository(
+            name=self.name, stars=self.stars, forks=self.forks, updated_at=self.updated_at
+        )
 
 
 class DBTask(Base):
     __tablename__ = "tasks"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    status: Mapped[TaskStatus] = mapped_column(default=TaskStatus.PENDING)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    status: Mapped[TaskStatus] = mapped_column(default=TaskStatus.PENDING, index=True)
+    # one task per user, a concurrent second insert conflicts instead of duplicating it
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True, unique=True)
     user: Mapped[DBUser] = relationship(lazy='joined')
-
-    def to_dto(self) -> Task:
-        return Task(id=self.id, user=self.user.to_dto(), status=self.status)
+    errors: Mapped[list["DBRepositoryError"]] = relationship(lazy='raise')
+    listed: Mapped[bool] = mapped_column(default=False, server_default=false())
+    expected: Mapped[int] = mapped_column(default=0, server_default='0')
+    done: Mapped[int] = mapped_column(default=0, server_default='0')
+    failed: Mapped[int] = mapped_column(default=0, server_default='0')
+    # UTC time the last crawl ended, unset while it's pending
+    finished_at: Mapped[Optional[datetime]] = mapped_column(default=None)
+    # UTC time the task last became PENDING, the crawl duration is measured from it
+    pending_since: Mapped[Optional[datetime]] = mapped_column(default=None)
+    # repos updated before it were all crawled, an incremental crawl lists only newer ones
+    watermark: Mapped[Optional[datetime]] = mapped_column(default=None)
+    # CrawlThroughput of the current or last crawl
+    throughput: Mapped[Optional[dict]] = mapped_column(JSON, default=None)
+
+    def to_dto(self, with_result: bool = False) -> Task:
+        progress = CrawlProgress(
+            listed=self.listed,
+            expected=self.expected,
+            done=self.done,
+            failed=self.failed,
+            throughput=_throughput_from_json(self.throughput),
+        )
+        if not with_result:
+            return Task(
+                id=self.id,
+                user=self.user.to_dto(),
+                status=self.status,
+                progress=progress,
+                finished_at=self.finished_at,
+            )
+        return Task(
+            id=self.id,
+            user=self.user.to_dto(with_repositories=True),
+            status=self.status,
+            progress=progress,
+            finished_at=self.finished_at,
+            failed_repositories=[error.to_dto() for error in self.errors],
+        )
 
     @classmethod
     def from_dto(cls, task: Task) -> 'DBTask':
         return cls(status=task.status)
 
 
+class DBRepositoryError(Base):
+    __tablename__ = "repo_errors"
+    __table_args__ = (UniqueConstraint('task_id', 'name'),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    task_id: Mapped[int] = mapped_column(ForeignKey("tasks.id"))
+    name: Mapped[str]
+    error: Mapped[str]
+
+    def to_dto(self) -> RepositoryError:
+        return RepositoryError(name=self.name, error=self.error)
+
+
 class CrawlerSQLiteStorage(CrawlerStorage):
-    def __init__(self, engine: AsyncEngine) -> None:
+    # keeps a single INSERT below SQLite's bound parameter limit
+    UPSERT_CHUNK_SIZE = 200
+
+    def __init__(self, engine: AsyncEngine, writer: Optional[SQLiteWriter] = None) -> None:
+        # reads use pooled connections of ``engine``, all writes go through ``writer``
         self.engine = engine
         self.session = async_sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
-
-    async def _create_task(self, session: AsyncSession, user: User) -> DBTask:
-        db_user = await self._get_or_create_user(session, user)
-        task = DBTask(user=db_user)
-        session.add(task)
-        await session.commit()
-        return task
-
-    async def _create_user(self, session: AsyncSession, user: User) -> DBUser:
-        dbuser = DBUser.from_dto(user)
-        session.add(dbuser)
-        await session.commit()
-        return dbuser
+        self.writer = writer or SQLiteWriter(engine)
 
     async def get_or_create_task(self, user: User) -> tuple[Task, bool]:
-        created = False
         async with self.session() as session:
-            dbuser = await self._get_or_create_user(session, user)
-            stmt = select(DBTask).where(DBTask.user_id == dbuser.id)
+            stmt = select(DBTask).join(DBTask.user).where(DBUser.name == user.name)
             task = (await session.execute(stmt)).scalar_one_or_none()
-            if task is None:
-                created = True
-                task = await self._create_task(session, user)
-
-            return task.to_dto(), created
-
-    async def _get_or_create_user(self, session: AsyncSession, user: User) -> DBUser:
-        dbuser = (
-            (await session.execute(select(DBUser).where(DBUser.name == user.name)))
-            .unique()
-            .scalar_one_or_none()
-        )
-        if dbuser is None:
-            dbuser = await self._create_user(session, user)
-        return dbuser
-
-    async def _get_or_create_repository(
-        self, session: AsyncSession, name: str, owner: DBUser
-    ) -> tuple[DBRepository, bool]:
-        created = False
-        stmt = select(DBRepository).where(DBRepository.name == name, DBRepository.owner == owner)
-        repo = (await session.execute(stmt)).scalar_one_or_none()
-        if repo is None:
-            created = True
-            repo = await self._create_repository(session, name, owner)
-        return repo, created
-
-    async def _create_repository(
-        self, session: AsyncSession, name: str, owner: DBUser
-    ) -> DBRepository:
-        repo = DBRepository(name=name, owner=owner)
-        session.add(repo)
-        await session.commit()
-        return repo
+            if task is not None:
+                return task.to_dto(), False
+
+        async with self.writer.transaction() as session:
+            # other processes may insert the same user or task meanwhile, those inserts are skipped
+            await self._insert_users(session, [user.name])
+            stmt = select(DBUser.id).where(DBUser.name == user.name)
+            user_id = (await session.execute(stmt)).scalar_one()
+            created = await self._insert_tasks(session, [user_id])
+            stmt = select(DBTask).join(DBTask.user).where(DBUser.name == user.name)
+            task = (await session.execute(stmt)).scalar_one()
+            return task.to_dto(), bool(created)
+
+    async def start_tasks(
+        self, users: list[User], fresh_since: datetime, incremental: bool = True
+    ) -> list[tuple[Task, bool]]:
+        names = list(dict.fromkeys(user.name for user in users))
+        result: dict[str, tuple[Task, bool]] = {}
+        async with self.writer.transaction() as session:
+            for start in range(0, len(names), self.UPSERT_CHUNK_SIZE):
+                chunk = names[start : start + self.UPSERT_CHUNK_SIZE]
+                result.update(
+                    await self._start_tasks_chunk(session, chunk, fresh_since, incremental)
+                )
+        return [result[user.name] for user in users]
+
+    async def _start_tasks_chunk(
+        self, session: AsyncSession, names: list[str], fresh_since: datetime, incremental: bool
+    ) -> dict[str, tuple[Task, bool]]:
+        await self._insert_users(session, names)
+        stmt = select(DBUser.id).where(DBUser.name.in_(names))
+        user_ids = list((await session.execute(stmt)).scalars())
+        restarted = await self._restart_tasks(
+            session, fresh_since, incremental, DBTask.user_id.in_(user_ids)
+        )
+        created = await self._insert_tasks(session, user_ids)
+        if created:
+            await session.execute(
+                update(DBRepository)
+                .where(DBRepository.owner_id.in_(created.values()))
+                .values(crawled=False)
+            )
+
+        started = set(restarted) | set(created)
+        stmt = select(DBTask).where(DBTask.user_id.in_(user_ids))
+        tasks = (await session.execute(stmt)).scalars()
+        return {task.user.name: (task.to_dto(), task.id in started) for task in tasks}
+
+    @staticmethod
+    async def _insert_users(session: AsyncSession, names: list[str]) -> None:
+        await session.execute(
+            sqlite_insert(DBUser)
+            .values([{'name': name} for name in names])
+            .on_conflict_do_nothing(index_elements=[DBUser.name])
+        )
+
+    @staticmethod
+    async def _insert_tasks(session: AsyncSession, user_ids: list[int]) -> dict[int, int]:
+        """Creates the missing tasks of the users; returns their user ids by created task id."""
+        if not user_ids:
+            return {}
+        now = datetime.utcnow()
+        stmt = (
+            sqlite_insert(DBTask)
+            .values(
+                [
+                    {'user_id': user_id, 'status': TaskStatus.PENDING, 'pending_since': now}
+                    for user_id in user_ids
+                ]
+            )
+            .on_conflict_do_nothing(index_elements=[DBTask.user_id])
+            .returning(DBTask.id, DBTask.user_id)
+        )
+        return {task_id: user_id for task_id, user_id in (await session.execute(stmt)).all()}
+
+    async def restart_task(
+        self, task: Task, fresh_since: datetime, incremental: bool = True
+    ) -> bool:
+        async with self.writer.transaction() as session:
+            restarted = await self._restart_tasks(
+                session, fresh_since, incremental, DBTask.id == task.id
+            )
+            return bool(restarted)
+
+    async def _restart_tasks(
+        self, session: AsyncSession, fresh_since: datetime, incremental: bool, *where
+    ) -> list[int]:
+        """Resets the matching tasks that are neither pending nor fresh; returns their ids.
+
+        The check and the reset are one UPDATE, so concurrent callers can't both restart a task.
+        """
+        values = {
+            'status': TaskStatus.PENDING,
+            'finished_at': None,
+            'pending_since': datetime.utcnow(),
+            'listed': False,
+            'expected': 0,
+            'done': 0,
+            'failed': 0,
+            'throughput': None,
+        }
+        if not incremental:
+            values['watermark'] = None
+        fresh = and_(
+            DBTask.status == TaskStatus.DONE,
+            DBTask.finished_at.is_not(None),
+            DBTask.finished_at >= fresh_since,
+        )
+        stmt = (
+            update(DBTask)
+            .where(*where, DBTask.status != TaskStatus.PENDING, not_(fresh))
+            .values(**values)
+            .returning(DBTask.id, DBTask.user_id, DBTask.watermark)
+            .execution_options(synchronize_session=False)
+        )
+        rows = (await session.execute(stmt)).all()
+        if not rows:
+            return []
+
+        # an incremental crawl keeps older repos crawled, it won't list them again
+        full = [user_id for _, user_id, watermark in rows if watermark is None]
+        if full:
+            await session.execute(
+                update(DBRepository).where(DBRepository.owner_id.in_(full)).values(crawled=False)
+            )
+        task_ids = [task_id for task_id, _, _ in rows]
+        await session.execute(
+            delete(DBRepositoryError).where(DBRepositoryError.task_id.in_(task_ids))
+        )
+        return task_ids
 
     async def get_task(self, task_id: int) -> Task:
         async with self.session() as session:
             stmt = select(DBTask).where(DBTask.id == task_id)
-            task = (await session.execute(stmt)).unique().scalar_one()
+            task = (await session.execute(stmt)).scalar_one()
             return task.to_dto()
 
+    async def find_task(self, task_id: int) -> Optional[Task]:
+        async with self.session() as session:
+            stmt = select(DBTask).where(DBTask.id == task_id)
+            task = (await session.execute(stmt)).scalar_one_or_none()
+            return task.to_dto() if task is not None else None
+
+    async def get_task_status(self, task_id: int) -> TaskStatus:
+        async with self.session() as session:
+            stmt = select(DBTask.status).where(DBTask.id == task_id)
+            return (await session.execute(stmt)).scalar_one()
+
+    async def get_task_result(self, task_id: int) -> Task:
+        async with self.session() as session:
+            stmt = (
+                select(DBTask)
+                .where(DBTask.id == task_id)
+                .options(
+                    selectinload(DBTask.user).selectinload(DBUser.repositories),
+                    selectinload(DBTask.errors),
+                )
+            )
+            task = (await session.execute(stmt)).scalar_one()
+            return task.to_dto(with_result=True)
+
+    async def get_task_repositories(
+        self,
+        task_id: int,
+        sort: RepositorySort = RepositorySort.ID,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+    ) -> RepositoryPage:
+        stmt = (
+            select(DBRepository)
+            .join(DBTask, DBTask.user_id == DBRepository.owner_id)
+            .where(DBTask.id == task_id)
+            .limit(limit)
+        )
+        if sort == RepositorySort.ID:
+            stmt = stmt.order_by(DBRepository.id)
+            if cursor is not None:
+                stmt = stmt.where(DBRepository.id > int(cursor))
+        else:
+            column = getattr(DBRepository, sort.value)
+            stmt = stmt.order_by(column.desc(), DBRepository.id)
+            if cursor is not None:
+                value, last_id = (int(part) for part in cursor.split(':'))
+                stmt = stmt.where(
+                    or_(column < value, and_(column == value, DBRepository.id > last_id))
+                )
+
+        async with self.session() as session:
+            repos = (await session.execute(stmt)).scalars().all()
+
+        next_cursor = None
+        if len(repos) == limit:
+            last = repos[-1]
+            if sort == RepositorySort.ID:
+                next_cursor = str(last.id)
+            else:
+                next_cursor = f'{getattr(last, sort.value)}:{last.id}'
+        return RepositoryPage(
+            repositories=[repo.to_dto() for repo in repos], next_cursor=next_cursor
+        )
+
+    async def iter_repository_rows(
+        self, filters: RepositoryFilter, chunk_size: int = 5000
+    ) -> AsyncIterator[list[RepositoryRow]]:
+        stmt = (
+            select(
+                DBRepository.id,
+                DBUser.name,
+                DBRepository.name,
+                DBRepository.stars,
+                DBRepository.forks,
+                DBRepository.updated_at,
+            )
+            .join(DBRepository.owner)
+            .order_by(DBRepository.id)
+            .limit(chunk_size)
+        )
+        if filters.user is not None:
+            stmt = stmt.where(DBUser.name == filters.user)
+        if filters.min_stars is not None:
+            stmt = stmt.where(DBRepository.stars >= filters.min_stars)
+        if filters.updated_since is not None:
+            stmt = stmt.where(DBRepository.updated_at >= filters.updated_since)
+
+        # every chunk is a short read of its own, so a long export never holds the WAL back
+        last_id = 0
+        while True:
+            async with self.session() as session:
+                rows = (await session.execute(stmt.where(DBRepository.id > last_id))).all()
+            if rows:
+                last_id = rows[-1][0]
+                yield [tuple(row[1:]) for row in rows]
+            if len(rows) < chunk_size:
+                return
+
+    async def get_repository_totals(self, user: str) -> Optional[RepositoryTotals]:
+        stmt = (
+            select(
+                func.count(DBRepository.id),
+                func.coalesce(func.sum(DBRepository.stars), 0),
+                func.coalesce(func.sum(DBRepository.forks), 0),
+            )
+            .select_from(DBUser)
+            .outerjoin(DBRepository, DBRepository.owner_id == DBUser.id)
+            .where(DBUser.name == user)
+            .group_by(DBUser.id)
+        )
+        async with self.session() as session:
+            row = (await session.execute(stmt)).one_or_none()
+        if row is None:
+            return None
+        return RepositoryTotals(user=user, repositories=row[0], stars=row[1], forks=row[2])
+
+    async def get_top_repositories(self, limit: int) -> list[OwnedRepository]:
+        # walks the stars index backwards and stops after ``limit`` rows
+        stmt = (
+            select(DBUser.name, DBRepository.name, DBRepository.stars, DBRepository.forks)
+            .join(DBRepository.owner)
+            .order_by(DBRepository.stars.desc(), DBRepository.id.desc())
+            .limit(limit)
+        )
+        async with self.session() as session:
+            rows = (await session.execute(stmt)).all()
+        return [
+            OwnedRepository(user=user, name=name, stars=stars, forks=forks)
+            for user, name, stars, forks in rows
+        ]
+
     async def _create_all(self) -> None:
-        async with self.engine.begin() as conn:
+        async with self.writer.engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
 
-    async def set_task_status(self, task: Task, status: TaskStatus):
-        async with self.session() as session, session.begin():
-            dbtask = (
-                await session.execute(select(DBTask).where(DBTask.id == task.id))
-            ).scalar_one()
-
-            dbtask.status = status
-            session.add(dbtask)
-            await session.commit()
+    async def _migrate(self) -> None:
+        async with self.writer.engine.begin() as conn:
+            await conn.run_sync(migrate_schema)
 
-    async def get_pending_tasks(self) -> list[Task]:
+    async def set_task_status(self, task: Task, status: TaskStatus):
+        async with self.writer.transaction() as session:
+            stmt = update(DBTask).where(DBTask.id == task.id)
+            if status == TaskStatus.PENDING:
+                values = {'finished_at': None, 'pending_since': datetime.utcnow()}
+                await session.execute(stmt.values(status=status, **values))
+                return
+            # only a pending task ends, so a crawl ended already keeps its status and is timed once
+            stmt = (
+                stmt.where(DBTask.status == TaskStatus.PENDING)
+                .values(status=status, finished_at=datetime.utcnow())
+                .returning(DBTask.pending_since, DBTask.finished_at)
+            )
+            row = (await session.execute(stmt)).one_or_none()
+            if row is not None:
+                _observe_task_duration(status, *row)
+
+    async def get_pending_tasks(self, after_id: int = 0, limit: Optional[int] = None) -> list[Task]:
         async with self.session() as session:
-            stmt = select(DBTask).where(DBTask.status == TaskStatus.PENDING)
+            stmt = (
+                select(DBTask)
+                .where(DBTask.status == TaskStatus.PENDING, DBTask.id > after_id)
+                .order_by(DBTask.id)
+                .limit(limit)
+            )
             tasks = (await session.execute(stmt)).scalars().all()
             return [task.to_dto() for task in tasks]
 
-    async def update_or_create_repository(
-        self, repo: Repository, owner: User
-    ) -> tuple[Repository, bool]:
+    async def get_last_task_id(self) -> int:
+        async with self.session() as session:
+            return (await session.execute(select(func.max(DBTask.id)))).scalar_one() or 0
+
+    async def reset_task_progress(self, task: Task, incremental: bool = True) -> None:
+        async with self.writer.transaction() as session:
+            values = {'listed': False, 'expected': 0, 'done': 0, 'failed': 0, 'throughput': None}
+            if not incremental:
+                values['watermark'] = None
+            stmt = update(DBTask).where(DBTask.id == task.id).values(**values)
+            watermark = (await session.execute(stmt.returning(DBTask.watermark))).scalar_one()
+            # an incremental crawl keeps older repos crawled, it won't list them again
+            if watermark is None:
+                await session.execute(
+                    update(DBRepository)
+                    .where(DBRepository.owner_id == self._task_owner_id(task.id).scalar_subquery())
+                    .values(crawled=False)
+                )
+            await session.execute(
+                delete(DBRepositoryError).where(DBRepositoryError.task_id == task.id)
+            )
+
+    async def get_crawl_watermark(self, task_id: int) -> Optional[datetime]:
+        async with self.session() as session:
+            stmt = select(DBTask.watermark).where(DBTask.id == task_id)
+            return (await session.execute(stmt)).scalar_one()
+
+    async def save_crawl_batch(self, task: Task, batch: CrawlBatch) -> None:
+        listed_done = len(batch.listed) if batch.listed_crawled else 0
+        async with self.writer.transaction() as session:
+            owner_id = (await session.execute(self._task_owner_id(task.id))).scalar_one()
+            # listed rows go first, details of the same repos in the batch then overwrite them
+            await self._upsert_repositories(session, owner_id, batch.listed, batch.listed_crawled)
+            await self._upsert_repositories(session, owner_id, batch.crawled, crawled=True)
+            if batch.errors:
+                stmt = sqlite_insert(DBRepositoryError)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[DBRepositoryError.task_id, DBRepositoryError.name],
+                    set_={'error': stmt.excluded.error},
+                )
+                await session.execute(
+                    stmt,
+                    [
+                        {'task_id': task.id, 'name': error.name, 'error': error.error}
+                        for error in batch.errors
+                    ],
+                )
+            values = {
+                'expected': DBTask.expected + len(batch.listed),
+                'done': DBTask.done + listed_done + len(batch.crawled),
+                'failed': DBTask.failed + len(batch.errors),
+            }
+            if batch.listing_done:
+                values['listed'] = True
+            if batch.throughput is not None:
+                values['throughput'] = asdict(batch.throughput)
+            await session.execute(update(DBTask).where(DBTask.id == task.id).values(**values))
+
+    async def complete_crawl(self, task: Task, throughput: Optional[CrawlThroughput]) -> bool:
+        owner_id = self._task_owner_id(task.id).scalar_subquery()
+        # a failed repo has to be listed again, so the mark can't move past it
+        oldest_failed = (
+            select(func.min(DBRepository.updated_at))
+            .join(
+                DBRepositoryError,
+                and_(
+                    DBRepositoryError.name == DBRepository.name,
+                    DBRepositoryError.task_id == task.id,
+                ),
+            )
+            .where(DBRepository.owner_id == owner_id)
+        )
+        newest_crawled = select(func.max(DBRepository.updated_at)).where(
+            DBRepository.owner_id == owner_id, DBRepository.crawled
+        )
+        watermark = func.coalesce(oldest_failed.scalar_subquery(), newest_crawled.scalar_subquery())
+        values = {
+            'status': TaskStatus.DONE,
+            'finished_at': datetime.utcnow(),
+            'watermark': watermark,
+        }
+        if throughput is not None:
+            values['throughput'] = asdict(throughput)
+        async with self.writer.transaction() as session:
+            # a task failed or restarted meanwhile keeps its status
+            stmt = (
+                update(DBTask)
+                .where(DBTask.id == task.id, DBTask.status == TaskStatus.PENDING)
+                .values(**values)
+                .returning(DBTask.pending_since, DBTask.finished_at)
+            )
+            row = (await session.execute(stmt)).one_or_none()
+            if row is None:
+                return False
+            _observe_task_duration(TaskStatus.DONE, *row)
+            return True
+
+    async def get_unfinished_repositories(self, task_id: int) -> list[str]:
+        async with self.session() as session:
+            failed = select(DBRepositoryError.name).where(DBRepositoryError.task_id == task_id)
+            stmt = select(DBRepository.name).where(
+                DBRepository.owner_id == self._task_owner_id(task_id).scalar_subquery(),
+                DBRepository.crawled == false(),
+                DBRepository.name.not_in(failed),
+            )
+            return list((await session.execute(stmt)).scalars().all())
+
+    async def get_repository_errors(self, task_id: int) -> list[RepositoryError]:
         async with self.session() as session:
-            dbowner = await self._get_user(session, owner)
-            dbrepo, created = await self._get_or_create_repository(session, repo.name, dbowner)
-            dbrepo.stars = repo.stars
-            dbrepo.forks = repo.forks
-            session.add(dbrepo)
-            await session.commit()
-
-            return dbrepo.to_dto(), created
-
-    async def _get_user(self, session: AsyncSession, user: User) -> DBUser:
-        dbuser = await session.execute(select(DBUser).where(DBUser.name == user.name))
-        return dbuser.scalar_one()
+            stmt = select(DBRepositoryError).where(DBRepositoryError.task_id == task_id)
+            errors = (await session.execute(stmt)).scalars().all()
+            return [error.to_dto() for error in errors]
+
+    async def retry_repository_errors(self, task_id: int) -> int:
+        async with self.writer.transaction() as session:
+            has_errors = (
+                select(DBRepositoryError.id).where(DBRepositoryError.task_id == DBTask.id).exists()
+            )
+            stmt = (
+                update(DBTask)
+                .where(DBTask.id == task_id, DBTask.status != TaskStatus.PENDING, has_errors)
+                .values(
+                    status=TaskStatus.PENDING,
+                    finished_at=None,
+                    pending_since=datetime.utcnow(),
+                    failed=0,
+                )
+                .returning(DBTask.id)
+                .execution_options(synchronize_session=False)
+            )
+            if (await session.execute(stmt)).scalar_one_or_none() is None:
+                return 0
+            # the failed repos are still uncrawled, without their errors a resume fetches them
+            cleared = await session.execute(
+                delete(DBRepositoryError).where(DBRepositoryError.task_id == task_id)
+            )
+            return cleared.rowcount
+
+    @staticmethod
+    def _task_owner_id(task_id: int):
+        return select(DBTask.user_id).where(DBTask.id == task_id)
+
+    async def _upsert_repositories(
+        self, session: AsyncSession, owner_id: int, repos: list[Repository], crawled: bool
+    ) -> None:
+        """Upserts repos in chunks; pending (not crawled) repos keep their stored stats."""
+        for start in range(0, len(repos), self.UPSERT_CHUNK_SIZE):
+            chunk = repos[start : start + self.UPSERT_CHUNK_SIZE]
+            stmt = sqlite_insert(DBRepository).values(
+                [
+                    {
+                        'owner_id': owner_id,
+                        'name': repo.name,
+                        'stars': repo.stars,
+                        'forks': repo.forks,
+                        'crawled': crawled,
+                        'updated_at': repo.updated_at,
+                    }
+                    for repo in chunk
+                ]
+            )
+            set_ = {
+                'crawled': stmt.excluded.crawled,
+                'updated_at': func.coalesce(stmt.excluded.updated_at, DBRepository.updated_at),
+            }
+            if crawled:
+                set_.update(stars=stmt.excluded.stars, forks=stmt.excluded.forks)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[DBRepository.owner_id, DBRepository.name], set_=set_
+            )
+            await session.execute(stmt)
+
+
+def _observe_task_duration(
+    status: TaskStatus, pending_since: Optional[datetime], finished_at: datetime
+) -> None:
+    # tasks of older versions became pending before the column existed
+    if pending_since is not None:
+        seconds = (finished_at - pending_since).total_seconds()
+        TASK_DURATION_SECONDS.labels(status.value).observe(seconds)
+
+
+def _throughput_from_json(data: Optional[dict]) -> Optional[CrawlThroughput]:
+    if data is None:
+        return None
+    return CrawlThroughput(**{stage: StageThroughput(**values) for stage, values in data.items()})
+
+
+def migrate_schema(conn: Connection) -> None:
+    """Creates tables, columns and indexes introduced after the database was created.
+
+    Only additive changes are handled, so every new column needs a server default.
+    An index made unique since is created again, which fails on duplicate rows.
+    """
+    Base.metadata.create_all(conn)
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = CreateColumn(column).compile(dialect=conn.dialect)
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {ddl}'))
+        # create_all skips tables that exist, indexes added to them later are created here
+        indexes = {index['name']: index for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            existing_index = indexes.get(index.name)
+            if existing_index is not None:
+                if bool(existing_index['unique']) == index.unique:
+                    continue
+                index.drop(conn)
+            index.create(conn)
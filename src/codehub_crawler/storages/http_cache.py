@@ -0,0 +1,106 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from sqlalchemy import JSON, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Mapped, mapped_column
+
+from codehub_crawler.storages.crawler_storage import Base
+from codehub_crawler.storages.sqlite_engine import SQLiteWriter
+
+
+@dataclass
+class CachedResponse:
+    payload: Any
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+class HTTPCache(ABC):
+    @abstractmethod
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, response: CachedResponse) -> None:
+        ...
+
+    @abstractmethod
+    async def flush(self) -> None:
+        """Stores entries the cache holds back, if it buffers any."""
+
+
+class DBHTTPCacheEntry(Base):
+    __tablename__ = "http_cache"
+
+    key: Mapped[str] = mapped_column(primary_key=True)
+    etag: Mapped[Optional[str]]
+    last_modified: Mapped[Optional[str]]
+    payload: Mapped[Any] = mapped_column(JSON)
+
+
+class SQLiteHTTPCache(HTTPCache):
+    """Keeps validators and parsed payloads of GET responses in the crawler database.
+
+    New entries are buffered and written by the next transaction of ``writer``, mostly
+    a crawl batch, or by one of their own once ``buffer_size`` of them are waiting.
+    """
+
+    def __init__(
+        self, engine: AsyncEngine, writer: Optional[SQLiteWriter] = None, buffer_size: int = 500
+    ) -> None:
+        self.session = async_sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+        self.writer = writer or SQLiteWriter(engine)
+        self.buffer_size = buffer_size
+        self._pending: dict[str, CachedResponse] = {}
+        self.writer.register_buffer(self._write_pending)
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        pending = self._pending.get(key)
+        if pending is not None:
+            return pending
+        async with self.session() as session:
+            stmt = select(DBHTTPCacheEntry).where(DBHTTPCacheEntry.key == key)
+            entry = (await session.execute(stmt)).scalar_one_or_none()
+            if entry is None:
+                return None
+            return CachedResponse(entry.payload, entry.etag, entry.last_modified)
+
+    async def set(self, key: str, response: CachedResponse) -> None:
+        self._pending[key] = response
+        if len(self._pending) >= self.buffer_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        if self._pending:
+            # the transaction writes the buffer before it commits
+            async with self.writer.transaction():
+                pass
+
+    async def _write_pending(self, session: AsyncSession) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        stmt = sqlite_insert(DBHTTPCacheEntry)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DBHTTPCacheEntry.key],
+            set_={
+                'etag': stmt.excluded.etag,
+                'last_modified': stmt.excluded.last_modified,
+                'payload': stmt.excluded.payload,
+            },
+        )
+        await session.execute(
+            stmt,
+            [
+                {
+                    'key': key,
+                    'etag': response.etag,
+                    'last_modified': response.last_modified,
+                    'payload': response.payload,
+                }
+                for key, response in pending.items()
+            ],
+        )
@@ -0,0 +1,111 @@
+import time
+from typing import Optional
+
+from sqlalchemy import ForeignKey, delete, or_, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Mapped, mapped_column
+
+from codehub_crawler.storages.crawler_storage import Base
+from codehub_crawler.storages.sqlite_engine import SQLiteWriter
+from core.infrastructure.base_job_queue import BaseJobQueue, Job
+
+
+class DBJob(Base):
+    __tablename__ = "jobs"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    # a row exists only while the task's crawl is queued or running
+    task_id: Mapped[int] = mapped_column(ForeignKey("tasks.id"), unique=True)
+    priority: Mapped[int] = mapped_column(default=0)
+    attempts: Mapped[int] = mapped_column(default=0)
+    worker_id: Mapped[Optional[str]]
+    # unix time the current lease runs out at, unset while the job is queued
+    lease_until: Mapped[Optional[float]] = mapped_column(index=True)
+
+
+class SQLiteJobQueue(BaseJobQueue):
+    """Job queue kept in the crawler's SQLite database.
+
+    Jobs are leased with a single ``UPDATE ... RETURNING``, so processes sharing
+    the database file never lease the same job twice.
+    """
+
+    ENQUEUE_CHUNK_SIZE = 500
+
+    def __init__(self, writer: SQLiteWriter) -> None:
+        self.writer = writer
+
+    async def enqueue(self, task_ids: list[int], priority: int = 0) -> None:
+        async with self.writer.transaction() as session:
+            for start in range(0, len(task_ids), self.ENQUEUE_CHUNK_SIZE):
+                chunk = task_ids[start : start + self.ENQUEUE_CHUNK_SIZE]
+                stmt = sqlite_insert(DBJob).values(
+                    [{'task_id': task_id, 'priority': priority} for task_id in chunk]
+                )
+                # the job of the task's previous run may still be leased by a worker about to
+                # complete it, unleased it runs again instead and that worker deletes nothing
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[DBJob.task_id],
+                    set_={
+                        'priority': stmt.excluded.priority,
+                        'attempts': 0,
+                        'worker_id': None,
+                        'lease_until': None,
+                    },
+                )
+                await session.execute(stmt)
+
+    async def lease(self, worker_id: str, limit: int, visibility_timeout: float) -> list[Job]:
+        now = time.time()
+        available = (
+            select(DBJob.id)
+            .where(or_(DBJob.lease_until.is_(None), DBJob.lease_until < now))
+            .order_by(DBJob.priority, DBJob.id)
+            .limit(limit)
+        )
+        stmt = (
+            update(DBJob)
+            .where(DBJob.id.in_(available.scalar_subquery()))
+            .values(
+                worker_id=worker_id,
+                lease_until=now + visibility_timeout,
+                attempts=DBJob.attempts + 1,
+            )
+            .returning(DBJob.id, DBJob.task_id, DBJob.attempts)
+            .execution_options(synchronize_session=False)
+        )
+        async with self.writer.transaction() as session:
+            rows = (await session.execute(stmt)).all()
+        return [Job(id=row.id, task_id=row.task_id, attempts=row.attempts) for row in rows]
+
+    async def heartbeat(
+        self, worker_id: str, job_ids: list[int], visibility_timeout: float
+    ) -> list[int]:
+        if not job_ids:
+            return []
+        stmt = (
+            update(DBJob)
+            .where(DBJob.id.in_(job_ids), DBJob.worker_id == worker_id)
+            .values(lease_until=time.time() + visibility_timeout)
+            .returning(DBJob.id)
+            .execution_options(synchronize_session=False)
+        )
+        async with self.writer.transaction() as session:
+            return list((await session.execute(stmt)).scalars().all())
+
+    async def complete(self, worker_id: str, job_id: int) -> None:
+        async with self.writer.transaction() as session:
+            await session.execute(
+                delete(DBJob).where(DBJob.id == job_id, DBJob.worker_id == worker_id)
+            )
+
+    async def release(self, worker_id: str, job_ids: list[int]) -> None:
+        if not job_ids:
+            return
+        async with self.writer.transaction() as session:
+            await session.execute(
+                update(DBJob)
+                .where(DBJob.id.in_(job_ids), DBJob.worker_id == worker_id)
+                .values(worker_id=None, lease_until=None, attempts=DBJob.attempts - 1)
+                .execution_options(synchronize_session=False)
+            )
@@ -0,0 +1,124 @@
+import asyncio
+import random
+import time
+from typing import Mapping, Optional
+
+
+class TokenBucket:
+    """Paces calls to ``rate`` per second with bursts of up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def take(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class TokenBudget:
+    __slots__ = ('token', 'remaining', 'reset_at', 'paused_until', 'probe_until')
+
+    # a probe that got no response, e.g. a connection error, lets the next one through after it
+    PROBE_TIMEOUT = 10.0
+
+    def __init__(self, token: str) -> None:
+        self.token = token
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0
+        self.paused_until = 0.0
+        self.probe_until = 0.0
+
+    def available(self, now: float, reserve: int) -> bool:
+        if now < self.paused_until:
+            return False
+        if self.remaining is not None and self.remaining <= reserve:
+            if now < self.reset_at or now < self.probe_until:
+                return False
+            # the window has reset: a single probe learns the new budget, the others wait for it
+            self.probe_until = now + self.PROBE_TIMEOUT
+        return True
+
+    def resume_at(self, now: float, reserve: int) -> float:
+        resume_at = self.paused_until
+        if self.remaining is not None and self.remaining <= reserve:
+            resume_at = max(resume_at, self.reset_at, self.probe_until)
+        return max(resume_at, now)
+
+
+class RateLimiter:
+    """Schedules GitHub requests over a pool of API tokens.
+
+    Every request first takes a slot from a shared token bucket, then the next
+    token (round-robin) that still has budget left according to the last
+    ``X-RateLimit-*`` headers, keeping ``reserve`` requests of each token unused.
+    When every token is exhausted or told to back off with ``Retry-After``,
+    ``acquire`` sleeps until the earliest one resumes instead of failing.
+    """
+
+    # GitHub asks to wait at least a minute on secondary limits without Retry-After
+    DEFAULT_PAUSE = 60.0
+    # waited past an exhausted window's reset, so clock skew doesn't hit the old window again
+    RESET_MARGIN = 1.0
+
+    def __init__(
+        self, tokens: list[str], requests_per_second: float, burst: int, reserve: int = 0
+    ) -> None:
+        if not tokens:
+            raise ValueError('Rate limiter needs at least one token')
+        self.bucket = TokenBucket(requests_per_second, burst)
+        self.reserve = reserve
+        self.budgets = {token: TokenBudget(token) for token in tokens}
+        self._order = list(self.budgets.values())
+        self._next = 0
+
+    async def acquire(self) -> str:
+        await self.bucket.take()
+        while True:
+            now = time.time()
+            for _ in range(len(self._order)):
+                budget = self._order[self._next]
+                self._next = (self._next + 1) % len(self._order)
+                if budget.available(now, self.reserve):
+                    if budget.remaining is not None:
+                        budget.remaining -= 1
+                    return budget.token
+            resume_at = min(budget.resume_at(now, self.reserve) for budget in self._order)
+            await asyncio.sleep(max(resume_at - now, 0.1))
+
+    def update(self, token: str, status: int, headers: Mapping[str, str]) -> bool:
+        """Records the budget reported by a response; returns True if it was rate limited."""
+        budget = self.budgets[token]
+        now = time.time()
+        probing, budget.probe_until = budget.probe_until > 0, 0.0
+        if 'X-RateLimit-Remaining' in headers:
+            budget.remaining = int(headers['X-RateLimit-Remaining'])
+        elif probing:
+            # the new window reported no budget, stop holding the token back
+            budget.remaining = None
+        if 'X-RateLimit-Reset' in headers:
+            budget.reset_at = float(headers['X-RateLimit-Reset'])
+
+        retry_after = headers.get('Retry-After')
+        limited = status == 429 or (status == 403 and (retry_after or budget.remaining == 0))
+        if not limited:
+            return False
+        if retry_after is not None:
+            budget.paused_until = now + float(retry_after)
+        elif budget.remaining == 0:
+            # jittered, so the tokens of one window don't all probe at the same moment
+            margin = self.RESET_MARGIN * random.uniform(0.5, 1.5)
+            budget.paused_until = max(budget.reset_at, now) + margin
+        else:
+            budget.paused_until = now + self.DEFAULT_PAUSE
+        return True
@@ -0,0 +1,88 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Protocol
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from codehub_crawler.metrics import SQLITE_WRITE_SECONDS, SQLITE_WRITER_WAIT_SECONDS
+
+
+class SQLiteConfiguration(Protocol):
+    SQLITE_DB_FILE: str
+    SQLITE_READ_POOL_SIZE: int
+    SQLITE_BUSY_TIMEOUT_MS: int
+    SQLITE_MMAP_SIZE: int
+    SQLITE_SYNCHRONOUS: str
+
+
+def create_sqlite_engine(config: SQLiteConfiguration, pool_size: int) -> AsyncEngine:
+    """Creates an engine whose pooled connections run in WAL mode.
+
+    WAL lets readers proceed while a write transaction is open, so reads never
+    wait for a crawl that is writing.
+    """
+    engine = create_async_engine(
+        f'sqlite+aiosqlite:///{config.SQLITE_DB_FILE}',
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=pool_size,
+        max_overflow=0,
+        pool_timeout=None,
+    )
+
+    @event.listens_for(engine.sync_engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f'PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}')
+        cursor.execute(f'PRAGMA busy_timeout={int(config.SQLITE_BUSY_TIMEOUT_MS)}')
+        cursor.execute(f'PRAGMA mmap_size={int(config.SQLITE_MMAP_SIZE)}')
+        cursor.close()
+
+    return engine
+
+
+class SQLiteWriter:
+    """Serialises write transactions on a single connection.
+
+    SQLite allows one writer at a time; queueing writers here in FIFO order
+    avoids ``database is locked`` errors from writers racing for the file lock.
+    """
+
+    def __init__(self, engine: AsyncEngine) -> None:
+        self.engine = engine
+        self.session = async_sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+        self._lock = asyncio.Lock()
+        self._buffers: list[Callable[[AsyncSession], Awaitable[None]]] = []
+
+    def register_buffer(self, flush: Callable[[AsyncSession], Awaitable[None]]) -> None:
+        """Makes every transaction run ``flush`` before it commits.
+
+        Rows buffered in memory then ride along with other writes instead of taking
+        the writer connection for transactions of their own.
+        """
+        self._buffers.append(flush)
+
+    async def flush_buffers(self, session: AsyncSession) -> None:
+        for flush in self._buffers:
+            await flush(session)
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[AsyncSession]:
+        waiting = time.perf_counter()
+        async with self._lock:
+            started = time.perf_counter()
+            SQLITE_WRITER_WAIT_SECONDS.observe(started - waiting)
+            try:
+                async with self.session() as session, session.begin():
+                    yield session
+                    await self.flush_buffers(session)
+            finally:
+                SQLITE_WRITE_SECONDS.observe(time.perf_counter() - started)
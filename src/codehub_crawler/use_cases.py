@@ -1,75 +1,269 @@
-from typing import Coroutine
+import asyncio
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Coroutine, Optional
 
+from common.single_flight import SingleFlight
+from core.infrastructure.base_job_queue import BaseJobQueue
 from core.infrastructure.base_queue import BaseQueue
 
-from .config import Config
-from .entities import Repository, Task, TaskStatus, User
+from .config import Config, CrawlMode
+from .entities import (
+    CrawlBatch,
+    OwnedRepository,
+    Repository,
+    RepositoryFilter,
+    RepositoryPage,
+    RepositoryRow,
+    RepositorySort,
+    RepositoryTotals,
+    Task,
+    TaskStatus,
+    User,
+)
 from .interfaces import CodeHubStorage, CrawlerStorage, Repository
-
-Repository.update_forward_refs()
-
-
-class DoneTaskRepoCounter:
-    def __init__(self, expected: int, done: int = 0) -> None:
-        self.expected = expected
-        self.done = done
+from .pipeline import CrawlPipeline
+from .result_cache import TaskResultCache, TaskResultDocument
 
 
 class UserRepositoriesUseCase:
     def __init__(
-        self, storage: CrawlerStorage, remote: CodeHubStorage, queue: BaseQueue, config: Config
+        self,
+        storage: CrawlerStorage,
+        remote: CodeHubStorage,
+        queue: BaseQueue,
+        config: Config,
+        jobs: Optional[BaseJobQueue] = None,
     ):
         self.storage = storage
         self.queue = queue
+        # with a job queue crawls run in worker processes, this one only enqueues them
+        self.jobs = jobs
         self.config = config
-        self.done_repo_counters: dict[int, DoneTaskRepoCounter] = {}
         self.remote = remote
+        self.result_cache = TaskResultCache(
+            config.RESULT_CACHE_SIZE, config.RESULT_CACHE_TTL, config.RESULT_CACHE_MAX_BYTES
+        )
+        self._creating: SingleFlight[str, int] = SingleFlight()
+        self._background: set[asyncio.Task] = set()
 
     async def create_task(self, user: User) -> int:
-        task, created = await self.storage.get_or_create_task(user)
-        if not created and task.status == TaskStatus.PENDING:
-            return task.id
+        # concurrent requests for one user would otherwise race into duplicate crawls
+        return await self._creating.run(user.name, lambda: self._create_task(user))
 
-        await self.storage.set_task_status(task, TaskStatus.PENDING)
-        task.status = TaskStatus.PENDING
-        await self._add_to_queue(task, self._request_user_repositories(task))
+    async def _create_task(self, user: User) -> int:
+        task, created = await self.storage.get_or_create_task(user)
+        if not created:
+            # a bulk request may restart the same task meanwhile, only one of them crawls it
+            fresh_since = self._fresh_since()
+            restarted = await self.storage.restart_task(
+                task, fresh_since, self.config.INCREMENTAL_CRAWL
+            )
+            if not restarted:
+                return task.id
+            self.result_cache.invalidate(task.id)
+            task.status = TaskStatus.PENDING
+        await self._start_crawls([task])
         return task.id
 
+    async def create_tasks(self, users: list[User]) -> list[int]:
+        """Creates or restarts the tasks of many users at once, in the order given.
+
+        The crawls are queued with ``BULK_TASK_PRIORITY``, in the background for the
+        in-process queue, so a big batch neither blocks the caller nor delays single
+        task requests.
+        """
+        results = await self.storage.start_tasks(
+            users, self._fresh_since(), incremental=self.config.INCREMENTAL_CRAWL
+        )
+        # a user listed twice gets the same task, which must be crawled once
+        started = {task.id: task for task, is_started in results if is_started}
+        for task_id in started:
+            self.result_cache.invalidate(task_id)
+        crawls = self._start_crawls(list(started.values()), self.config.BULK_TASK_PRIORITY)
+        if self.jobs is not None:
+            await crawls
+        else:
+            enqueue = asyncio.create_task(crawls)
+            self._background.add(enqueue)
+            enqueue.add_done_callback(self._background.discard)
+        return [task.id for task, _ in results]
+
+    async def retry_failed_repositories(self, task_id: int) -> int:
+        """Re-fetches only the repositories that failed in the last crawl of the task."""
+        retried = await self.storage.retry_repository_errors(task_id)
+        if not retried:
+            return 0
+        self.result_cache.invalidate(task_id)
+        # resuming the crawl fetches just the failed repos, the others are crawled
+        if self.jobs is not None:
+            await self.jobs.enqueue([task_id])
+        else:
+            task = await self.storage.get_task(task_id)
+            await self._add_to_queue(task, self._resume_repo_details(task))
+        return retried
+
+    async def get_task(self, task_id: int) -> Task:
+        return await self.storage.get_task(task_id)
+
+    async def find_task(self, task_id: int) -> Optional[Task]:
+        return await self.storage.find_task(task_id)
+
     async def get_task_result(self, task_id: int) -> Task:
-        task = await self.storage.get_task(task_id)
+        task = await self.storage.get_task_result(task_id)
         return task
 
+    async def get_task_result_document(self, task_id: int) -> Optional[TaskResultDocument]:
+        """Returns the serialised task result, from the cache when it hasn't changed.
+
+        Returns None for an unknown task.
+        """
+        document = self.result_cache.get(task_id)
+        if document is None:
+            if await self.storage.find_task(task_id) is None:
+                return None
+            epoch = self.result_cache.epoch
+            task = await self.storage.get_task_result(task_id)
+            if self.jobs is not None and task.status == TaskStatus.PENDING:
+                # worker processes write it, nothing here would invalidate the copy
+                return self.result_cache.render(task)
+            document = self.result_cache.put(task, epoch)
+        return document
+
+    async def get_task_repositories(
+        self,
+        task_id: int,
+        sort: RepositorySort = RepositorySort.ID,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+    ) -> RepositoryPage:
+        return await self.storage.get_task_repositories(task_id, sort, cursor, limit)
+
+    def iter_task_repositories(
+        self, task_id: int, sort: RepositorySort = RepositorySort.ID
+    ) -> AsyncIterator[list[Repository]]:
+        return self.storage.iter_task_repositories(
+            task_id, sort, self.config.RESULT_STREAM_CHUNK_SIZE
+        )
+
+    def iter_repository_rows(self, filters: RepositoryFilter) -> AsyncIterator[list[RepositoryRow]]:
+        return self.storage.iter_repository_rows(filters, self.config.EXPORT_CHUNK_SIZE)
+
+    async def get_repository_totals(self, user: str) -> Optional[RepositoryTotals]:
+        return await self.storage.get_repository_totals(user)
+
+    async def get_top_repositories(self, limit: int) -> list[OwnedRepository]:
+        return await self.storage.get_top_repositories(limit)
+
+    async def run_crawl(self, task_id: int) -> None:
+        """Crawls a pending task in this process and returns once the crawl is over.
+
+        A task listed by an earlier attempt only fetches its missing repositories.
+        """
+        task = await self.storage.get_task(task_id)
+        if task.status != TaskStatus.PENDING:
+            return
+        if task.progress.listed:
+            await self._resume_repo_details(task)
+        else:
+            await self._reset_task_progress(task)
+            await self._request_user_repositories(task)
+
+    async def fail_task(self, task_id: int) -> None:
+        task = await self.storage.get_task(task_id)
+        await self._set_task_status(task, TaskStatus.FAILED)
+
     async def restore_queue_tasks(self):
-        tasks = await self.storage.get_pending_tasks()
+        """Queues the crawls of tasks left pending by a previous run again.
+
+        Tasks are read in batches of ``RESTORE_BATCH_SIZE`` and queued with the queue's
+        backpressure, so a huge backlog neither delays startup nor floods memory. Tasks
+        created after startup, or already queued by this process, are left alone.
+        """
+        if self.jobs is not None:
+            # queued jobs are durable, workers lease them again once their leases run out
+            return
+        last_id = await self.storage.get_last_task_id()
+        after_id = 0
+        while after_id < last_id:
+            tasks = await self.storage.get_pending_tasks(after_id, self.config.RESTORE_BATCH_SIZE)
+            if not tasks:
+                return
+            after_id = tasks[-1].id
+            for task in tasks:
+                if task.id > last_id:
+                    return
+                if task.id in self.queue:
+                    continue
+                if task.progress.listed:
+                    # progress is in the database, so only the missing details are fetched again
+                    await self._add_to_queue(task, self._resume_repo_details(task))
+                else:
+                    await self._reset_task_progress(task)
+                    await self._add_to_queue(task, self._request_user_repositories(task))
+
+    def _fresh_since(self) -> datetime:
+        # tasks done after it are returned as they are
+        return datetime.utcnow() - timedelta(seconds=self.config.TASK_FRESHNESS_SECONDS)
+
+    async def _start_crawls(self, tasks: list[Task], priority: int = 0):
+        if self.jobs is not None and tasks:
+            await self.jobs.enqueue([task.id for task in tasks], priority)
+            return
         for task in tasks:
-            await self._add_to_queue(task, self._request_user_repositories(task))
+            await self._add_to_queue(task, self._request_user_repositories(task), priority)
 
     async def _request_user_repositories(self, task: Task):
-        try:
-            repos = await self.remote.get_user_repos(task.user)
-            self.done_repo_counters[task.id] = DoneTaskRepoCounter(expected=len(repos))
+        detail = self.config.CRAWL_MODE == CrawlMode.DETAIL
+        pages = self._list_user_repositories(task)
+        await self._crawl(task, pages, listing=True, fetch_details=detail)
 
-            for repo in repos:
-                await self._add_to_queue(task, self._request_repo_details(task, repo.name))
-        except Exception as e:
-            await self.storage.set_task_status(task, TaskStatus.FAILED)
+    async def _resume_repo_details(self, task: Task):
+        pages = self._list_unfinished_repositories(task)
+        await self._crawl(task, pages, listing=False, fetch_details=True)
+
+    async def _list_user_repositories(self, task: Task) -> AsyncIterator[list[Repository]]:
+        watermark = None
+        if self.config.INCREMENTAL_CRAWL:
+            watermark = await self.storage.get_crawl_watermark(task.id)
+        async for repos in self.remote.iter_user_repos(task.user, updated_since=watermark):
+            yield repos
 
-    async def _request_repo_details(self, task: Task, repo_name: str):
+    async def _list_unfinished_repositories(self, task: Task) -> AsyncIterator[list[Repository]]:
+        names = await self.storage.get_unfinished_repositories(task.id)
+        yield [Repository(name=name) for name in names]
+
+    async def _crawl(
+        self,
+        task: Task,
+        pages: AsyncIterator[list[Repository]],
+        listing: bool,
+        fetch_details: bool,
+    ):
+        pipeline = CrawlPipeline(
+            task, pages, self.remote, self._save_crawl_batch, self.config, listing, fetch_details
+        )
         try:
-            repo = await self.remote.get_repo_data(task.user, Repository(name=repo_name))
-            repo = await self.storage.update_or_create_repository(repo, owner=task.user)
+            await pipeline.run()
+            await self._complete_crawl(task, pipeline)
+        except Exception as e:
+            await self._set_task_status(task, TaskStatus.FAILED)
 
-            self.done_repo_counters[task.id].done += 1
+    async def _complete_crawl(self, task: Task, pipeline: CrawlPipeline):
+        # the single completion step: watermark, final throughput and DONE in one write
+        await self.storage.complete_crawl(task, pipeline.throughput())
+        self.result_cache.invalidate(task.id)
 
-            task_is_done = (
-                self.done_repo_counters[task.id].expected <= self.done_repo_counters[task.id].done
-                and (await self.storage.get_task(task.id)).status == TaskStatus.PENDING
-            )
-            if task_is_done:
-                await self.storage.set_task_status(task, TaskStatus.DONE)
+    async def _set_task_status(self, task: Task, status: TaskStatus):
+        await self.storage.set_task_status(task, status)
+        self.result_cache.invalidate(task.id)
 
-        except Exception as e:
-            await self.storage.set_task_status(task, TaskStatus.FAILED)
+    async def _reset_task_progress(self, task: Task):
+        await self.storage.reset_task_progress(task, self.config.INCREMENTAL_CRAWL)
+        self.result_cache.invalidate(task.id)
+
+    async def _save_crawl_batch(self, task: Task, batch: CrawlBatch):
+        await self.storage.save_crawl_batch(task, batch)
+        self.result_cache.invalidate(task.id)
 
-    async def _add_to_queue(self, task: Task, coro: Coroutine):
-        await self.queue.add_task(task.id, coro)
+    async def _add_to_queue(self, task: Task, coro: Coroutine, priority: int = 0):
+        await self.queue.add_task(task.id, coro, priority)
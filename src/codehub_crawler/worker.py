@@ -0,0 +1,78 @@
+import asyncio
+import os
+import socket
+from typing import Optional
+
+from core.infrastructure.base_job_queue import BaseJobQueue, Job
+
+from .config import Config
+from .use_cases import UserRepositoriesUseCase
+
+
+class CrawlWorker:
+    """Leases crawl jobs from the durable queue and runs them in this process.
+
+    Leases of running jobs are extended by a heartbeat. A job is completed only
+    after its crawl is over, so a crashed worker's jobs are leased again once
+    their visibility timeout runs out and resume from the stored progress.
+    """
+
+    def __init__(
+        self,
+        usecase: UserRepositoriesUseCase,
+        jobs: BaseJobQueue,
+        config: Config,
+        worker_id: Optional[str] = None,
+    ) -> None:
+        self.usecase = usecase
+        self.jobs = jobs
+        self.config = config
+        self.worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+        self._running: dict[int, asyncio.Task] = {}
+
+    async def run(self) -> None:
+        heartbeat = asyncio.create_task(self._heartbeat())
+        try:
+            while True:
+                leased = await self._lease()
+                for job in leased:
+                    self._running[job.id] = asyncio.create_task(self._run(job))
+                if not leased:
+                    await asyncio.sleep(self.config.JOB_POLL_INTERVAL)
+        finally:
+            heartbeat.cancel()
+            job_ids = list(self._running)
+            for run in self._running.values():
+                run.cancel()
+            await asyncio.gather(heartbeat, *self._running.values(), return_exceptions=True)
+            await self.jobs.release(self.worker_id, job_ids)
+
+    async def _lease(self) -> list[Job]:
+        free = self.config.WORKER_CONCURRENCY - len(self._running)
+        if free <= 0:
+            return []
+        return await self.jobs.lease(self.worker_id, free, self.config.JOB_VISIBILITY_TIMEOUT)
+
+    async def _run(self, job: Job) -> None:
+        try:
+            if job.attempts > self.config.JOB_MAX_ATTEMPTS:
+                await self.usecase.fail_task(job.task_id)
+            else:
+                await self.usecase.run_crawl(job.task_id)
+            await self.jobs.complete(self.worker_id, job.id)
+        except Exception:
+            # the job stays leased and is retried once the lease runs out
+            pass
+        finally:
+            self._running.pop(job.id, None)
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.config.JOB_HEARTBEAT_INTERVAL)
+            try:
+                await self.jobs.heartbeat(
+                    self.worker_id, list(self._running), self.config.JOB_VISIBILITY_TIMEOUT
+                )
+            except Exception:
+                # a missed beat is fine as long as the next one lands before the timeout
+                pass
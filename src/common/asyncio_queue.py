@@ -1,24 +1,40 @@
 import asyncio
-from typing import Coroutine
+from typing import Coroutine, Optional
 
-from core.infrastructure.base_queue import BaseQueue, TaskStatus
+from common.task_groups import TaskGroups
+from core.infrastructure.base_queue import BaseQueue, TaskProgress, TaskStatus
 
 
 class AsyncioQueue(BaseQueue):
-    def __init__(self):
-        self.tasks: dict[int, asyncio.Task] = {}
+    def __init__(self, group_ttl: float = 3600.0):
+        self.groups = TaskGroups(group_ttl)
+        self.tasks: set[asyncio.Task] = set()
 
-    async def add_task(self, task_id: int, coro: Coroutine):
+    async def add_task(self, task_id: int, coro: Coroutine, priority: int = 0):
+        # every coroutine starts right away, so there's nothing to prioritise
+        self.groups.submitted(task_id)
         task = asyncio.create_task(coro, name=str(task_id))
-        self.tasks[task_id] = task
+        self.tasks.add(task)
+        task.add_done_callback(lambda task: self._on_done(task_id, task))
 
-    async def get_task_status(self, task_id: int) -> TaskStatus:
-        task = self.tasks[task_id]
-        if not task.done():
-            return TaskStatus.PENDING
-        if task.exception() is not None:
-            return TaskStatus.FAILED
-        return TaskStatus.DONE
+    @property
+    def in_flight(self) -> int:
+        return len(self.tasks)
+
+    async def get_task_status(self, task_id: int) -> Optional[TaskStatus]:
+        progress = self.groups.progress(task_id)
+        return progress.status if progress is not None else None
+
+    async def get_task_progress(self, task_id: int) -> Optional[TaskProgress]:
+        return self.groups.progress(task_id)
 
     def remove_task(self, task_id: int):
-        self.tasks.pop(task_id)
+        self.groups.remove(task_id)
+
+    def __contains__(self, task_id: int) -> bool:
+        return task_id in self.groups
+
+    def _on_done(self, task_id: int, task: asyncio.Task) -> None:
+        self.tasks.discard(task)
+        failed = task.cancelled() or task.exception() is not None
+        self.groups.completed(task_id, failed)
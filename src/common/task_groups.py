@@ -0,0 +1,87 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from core.infrastructure.base_queue import TaskProgress, TaskStatus
+
+
+class TaskGroup:
+    __slots__ = ('total', 'done', 'failed', 'finished_at')
+
+    def __init__(self) -> None:
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.finished_at: Optional[float] = None
+
+    @property
+    def running(self) -> int:
+        return self.total - self.done - self.failed
+
+    def progress(self) -> TaskProgress:
+        if self.running:
+            status = TaskStatus.PENDING
+        elif self.failed:
+            status = TaskStatus.FAILED
+        else:
+            status = TaskStatus.DONE
+        return TaskProgress(status=status, total=self.total, done=self.done, failed=self.failed)
+
+
+class TaskGroups:
+    """Bookkeeping for all coroutines enqueued under one task id.
+
+    A group collects every sub-job of a task. Once all of them are finished the
+    group is kept for ``ttl`` seconds so its status can still be read, then it is
+    evicted on the next access. Submitting to a finished group starts a fresh run of it.
+    """
+
+    def __init__(self, ttl: float = 3600.0):
+        self.ttl = ttl
+        self._groups: dict[int, TaskGroup] = {}
+        self._finished: OrderedDict[int, float] = OrderedDict()
+
+    def submitted(self, task_id: int) -> None:
+        self.evict_expired()
+        group = self._groups.get(task_id)
+        if group is None or group.finished_at is not None:
+            self._finished.pop(task_id, None)
+            group = self._groups[task_id] = TaskGroup()
+        group.total += 1
+
+    def completed(self, task_id: int, failed: bool = False) -> None:
+        group = self._groups.get(task_id)
+        if group is None:
+            return
+        if failed:
+            group.failed += 1
+        else:
+            group.done += 1
+        if not group.running:
+            group.finished_at = time.monotonic()
+            self._finished[task_id] = group.finished_at
+
+    def progress(self, task_id: int) -> Optional[TaskProgress]:
+        """Returns None for a task id never submitted or evicted already."""
+        self.evict_expired()
+        group = self._groups.get(task_id)
+        return group.progress() if group is not None else None
+
+    def remove(self, task_id: int) -> None:
+        self._groups.pop(task_id, None)
+        self._finished.pop(task_id, None)
+
+    def evict_expired(self) -> None:
+        deadline = time.monotonic() - self.ttl
+        while self._finished:
+            task_id, finished_at = next(iter(self._finished.items()))
+            if finished_at > deadline:
+                break
+            self.remove(task_id)
+
+    def __contains__(self, task_id: int) -> bool:
+        self.evict_expired()
+        return task_id in self._groups
+
+    def __len__(self) -> int:
+        return len(self._groups)
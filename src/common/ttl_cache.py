@@ -0,0 +1,63 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, Optional, TypeVar
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+
+class TTLCache(Generic[K, V]):
+    """LRU cache of at most ``maxsize`` entries, each valid for ``ttl`` seconds.
+
+    With ``weigh`` the entries also weigh at most ``maxweight`` together, a value
+    heavier than that on its own is not stored at all.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        maxweight: Optional[int] = None,
+        weigh: Optional[Callable[[V], int]] = None,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxweight = maxweight
+        self.weigh = weigh
+        self.weight = 0
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def get(self, key: K) -> Optional[V]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self.pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V) -> None:
+        self.pop(key)
+        weight = self._weigh(value)
+        if self.maxweight is not None and weight > self.maxweight:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self.weight += weight
+        while len(self._entries) > self.maxsize or (
+            self.maxweight is not None and self.weight > self.maxweight
+        ):
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.weight -= self._weigh(evicted)
+
+    def pop(self, key: K) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.weight -= self._weigh(entry[1])
+
+    def _weigh(self, value: V) -> int:
+        return self.weigh(value) if self.weigh is not None else 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,124 @@
+import asyncio
+import itertools
+from collections import deque
+from contextvars import ContextVar
+from typing import Coroutine, Optional
+
+from common.task_groups import TaskGroups
+from core.infrastructure.base_queue import BaseQueue, TaskProgress, TaskStatus
+
+_inside_worker: ContextVar[bool] = ContextVar('_inside_worker', default=False)
+
+
+class WorkerPoolQueue(BaseQueue):
+    """Runs queued coroutines on a fixed pool of worker coroutines.
+
+    Coroutines are grouped by task id and the groups are served round-robin, so
+    one huge task can't starve the others. Groups of a lower priority value are
+    served before any group of a higher one. ``add_task`` waits while ``max_depth``
+    coroutines are queued. Coroutines enqueued by a running job skip that wait,
+    otherwise a pool whose workers all fan out would deadlock on itself.
+    """
+
+    def __init__(self, concurrency: int = 32, max_depth: int = 1000, group_ttl: float = 3600.0):
+        self.concurrency = concurrency
+        self.max_depth = max_depth
+        self.groups = TaskGroups(group_ttl)
+        self._pending: dict[int, deque[Coroutine]] = {}
+        self._priorities: dict[int, int] = {}
+        self._depth = 0
+        # (priority, sequence, task id): the sequence keeps groups of one priority round-robin
+        self._ready: asyncio.PriorityQueue[tuple[int, int, int]] = asyncio.PriorityQueue()
+        self._sequence = itertools.count()
+        self._not_full = asyncio.Condition()
+        self._workers: list[asyncio.Task] = []
+        self._running = 0
+
+    async def start(self) -> None:
+        if self._workers:
+            return
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f'queue-worker-{i}')
+            for i in range(self.concurrency)
+        ]
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for group in self._pending.values():
+            for coro in group:
+                coro.close()
+        self._pending.clear()
+        self._priorities.clear()
+        self._depth = 0
+
+    async def add_task(self, task_id: int, coro: Coroutine, priority: int = 0) -> None:
+        await self.start()
+        if not _inside_worker.get():
+            try:
+                async with self._not_full:
+                    await self._not_full.wait_for(lambda: self._depth < self.max_depth)
+            except asyncio.CancelledError:
+                # the caller gave up while waiting, the coroutine will never run
+                coro.close()
+                raise
+
+        self.groups.submitted(task_id)
+        group = self._pending.get(task_id)
+        if group is None:
+            group = self._pending[task_id] = deque()
+            self._priorities[task_id] = priority
+            self._make_ready(task_id)
+        group.append(coro)
+        self._depth += 1
+
+    @property
+    def depth(self) -> int:
+        return self._depth
+
+    @property
+    def in_flight(self) -> int:
+        return self._running
+
+    async def get_task_status(self, task_id: int) -> Optional[TaskStatus]:
+        progress = self.groups.progress(task_id)
+        return progress.status if progress is not None else None
+
+    async def get_task_progress(self, task_id: int) -> Optional[TaskProgress]:
+        return self.groups.progress(task_id)
+
+    def remove_task(self, task_id: int):
+        self.groups.remove(task_id)
+
+    def __contains__(self, task_id: int) -> bool:
+        return task_id in self.groups
+
+    def _make_ready(self, task_id: int) -> None:
+        self._ready.put_nowait((self._priorities[task_id], next(self._sequence), task_id))
+
+    async def _worker(self) -> None:
+        _inside_worker.set(True)
+        while True:
+            _, _, task_id = await self._ready.get()
+            group = self._pending[task_id]
+            coro = group.popleft()
+            if group:
+                self._make_ready(task_id)
+            else:
+                del self._pending[task_id]
+                del self._priorities[task_id]
+            self._depth -= 1
+            async with self._not_full:
+                self._not_full.notify()
+
+            self._running += 1
+            try:
+                await coro
+            except Exception:
+                self.groups.completed(task_id, failed=True)
+            else:
+                self.groups.completed(task_id)
+            finally:
+                self._running -= 1
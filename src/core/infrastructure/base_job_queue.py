@@ -0,0 +1,44 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+
+
+@dataclass
+class Job:
+    id: int
+    task_id: int
+    # leases taken so far, including the current one
+    attempts: int
+
+
+class BaseJobQueue(ABC):
+    """Durable queue of task jobs shared by several worker processes.
+
+    A leased job is hidden from other workers until its lease runs out, so a job
+    of a worker that died is picked up again after the visibility timeout.
+    """
+
+    @abstractmethod
+    async def enqueue(self, task_ids: list[int], priority: int = 0) -> None:
+        """Queues one job per task; a task that already has a job isn't queued twice.
+
+        An existing job is made available again with its attempts reset, so a task
+        restarted while a worker finishes its previous run is crawled once more.
+        """
+
+    @abstractmethod
+    async def lease(self, worker_id: str, limit: int, visibility_timeout: float) -> list[Job]:
+        """Leases up to ``limit`` available jobs, lower priority values first."""
+
+    @abstractmethod
+    async def heartbeat(
+        self, worker_id: str, job_ids: list[int], visibility_timeout: float
+    ) -> list[int]:
+        """Extends the leases and returns the ids of jobs still leased by the worker."""
+
+    @abstractmethod
+    async def complete(self, worker_id: str, job_id: int) -> None:
+        ...
+
+    @abstractmethod
+    async def release(self, worker_id: str, job_ids: list[int]) -> None:
+        """Gives the jobs back before their leases run out."""
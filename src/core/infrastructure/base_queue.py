@@ -1,6 +1,8 @@
 from abc import ABC, abstractmethod
 from collections.abc import Coroutine
+from dataclasses import dataclass
 from enum import Enum
+from typing import Optional
 
 
 class TaskStatus(str, Enum):
@@ -9,14 +11,46 @@ class TaskStatus(str, Enum):
     FAILED = 'failed'
 
 
+@dataclass
+class TaskProgress:
+    status: TaskStatus
+    total: int = 0
+    done: int = 0
+    failed: int = 0
+
+
 class BaseQueue(ABC):
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    @property
+    def depth(self) -> int:
+        """Coroutines queued and not started yet."""
+        return 0
+
+    @property
+    def in_flight(self) -> int:
+        """Coroutines running right now."""
+        return 0
+
+    def __contains__(self, task_id: int) -> bool:
+        """Whether coroutines were queued under ``task_id`` and their group isn't evicted yet."""
+        return False
+
     @abstractmethod
-    async def add_task(self, task_id: int, coro: Coroutine) -> None:
-        ...
+    async def add_task(self, task_id: int, coro: Coroutine, priority: int = 0) -> None:
+        """Queues ``coro`` under ``task_id``; lower ``priority`` values run first."""
 
     @abstractmethod
-    async def get_task_status(self, task_id: int) -> TaskStatus:
-        ...
+    async def get_task_status(self, task_id: int) -> Optional[TaskStatus]:
+        """Returns None once the task's group is evicted, or if it was never queued."""
+
+    @abstractmethod
+    async def get_task_progress(self, task_id: int) -> Optional[TaskProgress]:
+        """Returns None once the task's group is evicted, or if it was never queued."""
 
     @abstractmethod
     def remove_task(self, task_id: int):
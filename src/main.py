@@ -1,9 +1,29 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 
+from fastapi import FastAPI, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from codehub_crawler.context import close_app, init_app
 from config import settings
 from router import api_router
 
-app = FastAPI(openapi_url=f"{settings.API_V1_STR}/openapi.json")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    await init_app()
+    try:
+        yield
+    finally:
+        await close_app()
+
+
+app = FastAPI(openapi_url=f"{settings.API_V1_STR}/openapi.json", lifespan=lifespan)
 
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
+
+
+@app.get('/metrics', include_in_schema=False)
+async def metrics() -> Response:
+    return Response(generate_latest(), headers={'Content-Type': CONTENT_TYPE_LATEST})
@@ -0,0 +1,187 @@
+import asyncio
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterator, Collection, Optional
+
+SRC = Path(__file__).resolve().parent.parent / 'src'
+sys.path.insert(0, str(SRC))
+
+from codehub_crawler.config import Config, CrawlMode
+from codehub_crawler.entities import CrawlBatch, Repository, Task, TaskStatus, User
+from codehub_crawler.interfaces import CodeHubStorage
+from codehub_crawler.storages.crawler_storage import CrawlerSQLiteStorage
+from codehub_crawler.storages.sqlite_engine import SQLiteWriter, create_sqlite_engine
+from codehub_crawler.use_cases import UserRepositoriesUseCase
+from common.asyncio_queue import AsyncioQueue
+
+UPDATED = datetime(2023, 9, 1)
+# a crawl that hangs would otherwise block the suite
+CRAWL_TIMEOUT = 10.0
+
+
+def make_repos(count: int) -> list[Repository]:
+    return [
+        Repository(name=f'r{i}', stars=i, forks=2 * i, updated_at=UPDATED + timedelta(hours=i))
+        for i in range(count)
+    ]
+
+
+class FakeCodeHub(CodeHubStorage):
+    """Lists ``repos`` newest first in pages, stopping at the watermark like GithubStorage."""
+
+    def __init__(self, repos: list[Repository], per_page: int = 10, broken: Collection[str] = ()):
+        self.repos = sorted(repos, key=lambda repo: repo.updated_at, reverse=True)
+        self.per_page = per_page
+        self.broken = broken
+        self.details: list[str] = []
+
+    async def iter_user_repos(
+        self, user: User, updated_since: Optional[datetime] = None
+    ) -> AsyncIterator[list[Repository]]:
+        for start in range(0, max(len(self.repos), 1), self.per_page):
+            await asyncio.sleep(0)
+            page = self.repos[start : start + self.per_page]
+            newer = [
+                repo for repo in page if updated_since is None or repo.updated_at >= updated_since
+            ]
+            yield newer
+            if len(newer) < len(page):
+                return
+
+    async def get_repo_data(self, owner: User, repo: Repository) -> Repository:
+        self.details.append(repo.name)
+        await asyncio.sleep(0)
+        if repo.name in self.broken:
+            raise RuntimeError(f'{repo.name} is broken')
+        return next(stored for stored in self.repos if stored.name == repo.name)
+
+
+class RecordingStorage(CrawlerSQLiteStorage):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.batches: list[CrawlBatch] = []
+
+    async def save_crawl_batch(self, task: Task, batch: CrawlBatch) -> None:
+        self.batches.append(batch)
+        await super().save_crawl_batch(task, batch)
+
+
+class CrawlPipelineTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.config = Config()
+        self.config.SQLITE_DB_FILE = str(Path(self.directory.name) / 'crawler.sqlite')
+        # small batches and channels, so a crawl spans several writes and waits on full channels
+        self.config.REPO_WRITE_BATCH_SIZE = 5
+        self.config.PIPELINE_CHANNEL_SIZE = 2
+        self.config.PIPELINE_FETCH_CONCURRENCY = 3
+        self.config.PIPELINE_WRITE_LINGER = 0.01
+        self.config.INCREMENTAL_CRAWL = True
+        self.writer = SQLiteWriter(create_sqlite_engine(self.config, pool_size=1))
+        self.storage = RecordingStorage(create_sqlite_engine(self.config, pool_size=2), self.writer)
+        await self.storage._create_all()
+
+    async def asyncTearDown(self) -> None:
+        await self.writer.engine.dispose()
+        await self.storage.engine.dispose()
+        self.directory.cleanup()
+
+    async def crawl(self, hub: FakeCodeHub, mode: CrawlMode) -> Task:
+        self.config.CRAWL_MODE = mode
+        usecase = UserRepositoriesUseCase(self.storage, hub, AsyncioQueue(), self.config)
+        task, _ = await self.storage.get_or_create_task(User(name='octocat'))
+        await asyncio.wait_for(usecase.run_crawl(task.id), CRAWL_TIMEOUT)
+        return await self.storage.get_task_result(task.id)
+
+    def assert_stored(self, task: Task, repos: list[Repository]) -> None:
+        stored = {repo.name: (repo.stars, repo.forks) for repo in task.user.repositories}
+        self.assertEqual(stored, {repo.name: (repo.stars, repo.forks) for repo in repos})
+
+    async def test_list_mode_stores_the_listing(self):
+        repos = make_repos(25)
+        hub = FakeCodeHub(repos)
+
+        task = await self.crawl(hub, CrawlMode.LIST)
+
+        self.assertEqual(task.status, TaskStatus.DONE)
+        self.assertTrue(task.progress.listed)
+        self.assertEqual(
+            (task.progress.expected, task.progress.done, task.progress.failed), (25, 25, 0)
+        )
+        self.assertEqual(hub.details, [])
+        self.assert_stored(task, repos)
+
+    async def test_detail_mode_records_failed_repositories(self):
+        repos = make_repos(25)
+        hub = FakeCodeHub(repos, broken={'r3', 'r17'})
+
+        task = await self.crawl(hub, CrawlMode.DETAIL)
+
+        self.assertEqual(task.status, TaskStatus.DONE)
+        self.assertEqual(
+            (task.progress.expected, task.progress.done, task.progress.failed), (25, 23, 2)
+        )
+        self.assertEqual(sorted(hub.details), sorted(repo.name for repo in repos))
+        self.assertEqual(sorted(error.name for error in task.failed_repositories), ['r17', 'r3'])
+        self.assertGreater(len(self.storage.batches), 1)
+
+    async def test_detail_mode_stores_pages_before_their_details(self):
+        hub = FakeCodeHub(make_repos(25))
+
+        await self.crawl(hub, CrawlMode.DETAIL)
+
+        listed_in, crawled_in = {}, {}
+        for index, batch in enumerate(self.storage.batches):
+            for repo in batch.listed:
+                listed_in.setdefault(repo.name, index)
+            for repo in batch.crawled:
+                crawled_in[repo.name] = index
+        self.assertEqual(set(crawled_in), set(listed_in))
+        # save_crawl_batch writes the listed repos of a batch before its crawled ones
+        for name, index in crawled_in.items():
+            self.assertLessEqual(listed_in[name], index, name)
+        self.assertEqual(sum(batch.listing_done for batch in self.storage.batches), 1)
+
+    async def test_resume_fetches_only_missing_repositories(self):
+        repos = make_repos(25)
+        task, _ = await self.storage.get_or_create_task(User(name='octocat'))
+        # an earlier attempt listed every repo and crawled ten before its worker died
+        await self.storage.save_crawl_batch(task, CrawlBatch(listed=repos, listing_done=True))
+        await self.storage.save_crawl_batch(task, CrawlBatch(crawled=repos[:10]))
+        hub = FakeCodeHub(repos)
+
+        task = await self.crawl(hub, CrawlMode.DETAIL)
+
+        self.assertEqual(task.status, TaskStatus.DONE)
+        self.assertEqual(sorted(hub.details), sorted(repo.name for repo in repos[10:]))
+        self.assertEqual(
+            (task.progress.expected, task.progress.done, task.progress.failed), (25, 25, 0)
+        )
+        self.assert_stored(task, repos)
+
+    async def test_empty_incremental_listing_finishes_the_crawl(self):
+        repos = make_repos(25)
+        task = await self.crawl(FakeCodeHub(repos), CrawlMode.LIST)
+        restarted = await self.storage.restart_task(task, datetime.utcnow() + timedelta(days=1))
+        self.assertTrue(restarted)
+        # the newest repo was deleted since, nothing left is newer than the watermark
+        hub = FakeCodeHub(repos[:-1])
+        self.storage.batches.clear()
+
+        task = await self.crawl(hub, CrawlMode.DETAIL)
+
+        self.assertEqual(task.status, TaskStatus.DONE)
+        self.assertTrue(task.progress.listed)
+        self.assertEqual(
+            (task.progress.expected, task.progress.done, task.progress.failed), (0, 0, 0)
+        )
+        self.assertEqual(hub.details, [])
+        self.assertEqual([batch.listing_done for batch in self.storage.batches], [True])
+        self.assert_stored(task, repos)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / 'src'
+
+# third party imports alone take about a second, anything built at import time shows up above
+IMPORT_BUDGET_SECONDS = 3.0
+
+PROBE = '''
+import time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+import codehub_crawler.context
+print(elapsed, codehub_crawler.context._context is None)
+'''
+
+
+class ImportTimeTest(unittest.TestCase):
+    def test_main_app_imports_within_budget_without_context(self):
+        # no token: building GithubStorage at import time would fail right away
+        env = {
+            name: value
+            for name, value in os.environ.items()
+            if name not in ('GH_API_TOKEN', 'GH_API_TOKENS')
+        }
+        probe = subprocess.run(
+            [sys.executable, '-c', PROBE],
+            cwd=SRC,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        elapsed, no_context = probe.stdout.split()
+        self.assertLess(float(elapsed), IMPORT_BUDGET_SECONDS)
+        self.assertEqual(no_context, 'True', 'importing main:app built the context')
+
+
+if __name__ == '__main__':
+    unittest.main()